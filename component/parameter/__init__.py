@@ -1,2 +1,10 @@
 from .directory import *
-from .file_params import *
+from .file_params import get_parameter_file
+
+
+def __getattr__(name):
+    """Resolve parameter_file on first access, see file_params.get_parameter_file."""
+    if name == "parameter_file":
+        return get_parameter_file()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
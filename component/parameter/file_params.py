@@ -1,8 +1,25 @@
 import inspect
+from functools import lru_cache
 from pathlib import Path
 
-import biota
 
-# Parameter file
-biota_root = Path(inspect.getabsfile(biota)).parent
-parameter_file = biota_root / "cfg/McNicol2018.csv"
+@lru_cache()
+def get_parameter_file():
+    """Return the biota calibration parameter file.
+
+    biota is only imported on the first call, it loads the whole scientific
+    stack (gdal, scipy, scikit-image...).
+    """
+    import biota
+
+    biota_root = Path(inspect.getabsfile(biota)).parent
+
+    return biota_root / "cfg/McNicol2018.csv"
+
+
+def __getattr__(name):
+    """Resolve parameter_file on first access, see get_parameter_file."""
+    if name == "parameter_file":
+        return get_parameter_file()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+from shapely.geometry import mapping
+
+try:
+    from osgeo import gdal, ogr
+except ImportError:
+    import gdal
+    import ogr
+
+
+def rasterize(geometry, geo_t, shape):
+    """Return the pixels of a grid touched by a geometry.
+
+    Args:
+        geometry (shapely.geometry): area of interest in EPSG:4326
+        geo_t (tuple): gdal geotransform of the grid, in degrees
+        shape (tuple): number of rows and columns of the grid
+
+    Returns:
+        (np.ndarray): boolean array, True within the geometry
+    """
+    y_size, x_size = shape
+    ds = gdal.GetDriverByName("MEM").Create("", x_size, y_size, 1, gdal.GDT_Byte)
+    ds.SetGeoTransform(geo_t)
+
+    # The GeoJSON driver opens the geometry straight from its text
+    source = ogr.Open(json.dumps(mapping(geometry)))
+    gdal.RasterizeLayer(
+        ds, [1], source.GetLayer(), burn_values=[1], options=["ALL_TOUCHED=TRUE"]
+    )
+    inside = ds.GetRasterBand(1).ReadAsArray().astype(bool)
+    ds = source = None
+
+    return inside
+
+
+def bounding_window(inside, margin=0):
+    """Return the smallest window holding all the pixels of a mask.
+
+    Args:
+        inside (np.ndarray): boolean array of the pixels to hold
+        margin (int): extra pixels around the window, within the array
+
+    Returns:
+        (tuple): top, bottom, left and right (excluded) pixels of the window,
+            None if the mask is empty
+    """
+    rows = np.flatnonzero(inside.any(axis=1))
+    cols = np.flatnonzero(inside.any(axis=0))
+
+    if not rows.size:
+        return None
+
+    y_size, x_size = inside.shape
+
+    return (
+        max(0, int(rows[0]) - margin),
+        min(y_size, int(rows[-1]) + 1 + margin),
+        max(0, int(cols[0]) - margin),
+        min(x_size, int(cols[-1]) + 1 + margin),
+    )
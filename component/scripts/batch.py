@@ -0,0 +1,249 @@
+import logging
+import math
+import multiprocessing
+import resource
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from shapely.geometry import box
+
+from .cache import DiskCache
+from .download import TileCatalogue, sub_tiles
+from .pipeline import CATEGORICAL_OUTPUTS, Pipeline, output_filename
+
+logger = logging.getLogger(__name__)
+
+# Pipeline of the current worker process, see _init_worker
+_pipeline = None
+
+
+def tiles_from_bounds(min_lon, min_lat, max_lon, max_lat):
+    """Return the upper-left corners of the 1x1 tiles covering a bounding box.
+
+    Args:
+        min_lon (float): western bound of the area in degrees
+        min_lat (float): southern bound of the area in degrees
+        max_lon (float): eastern bound of the area in degrees
+        max_lat (float): northern bound of the area in degrees
+
+    Returns:
+        (list): (lat, lon) tuples ordered from north-west to south-east
+    """
+    # Always keep at least one tile, even for a point
+    north = math.ceil(max_lat)
+    lats = range(north, min(math.floor(min_lat), north - 1), -1)
+    lons = range(math.floor(min_lon), max(math.ceil(max_lon), math.floor(min_lon) + 1))
+
+    return [(lat, lon) for lat in lats for lon in lons]
+
+
+def tiles_from_geometry(geometry):
+    """Return the upper-left corners of the 1x1 tiles intersecting a geometry.
+
+    Args:
+        geometry (shapely.geometry): area of interest in EPSG:4326
+    """
+    return [
+        (lat, lon)
+        for lat, lon in tiles_from_bounds(*geometry.bounds)
+        if box(lon, lat - 1, lon + 1, lat).intersects(geometry)
+    ]
+
+
+def read_geometry(path):
+    """Read a vector file (GeoJSON, shapefile...) as a single EPSG:4326 geometry.
+
+    Args:
+        path (str, Path): path of the vector file
+    """
+    import geopandas as gpd
+
+    gdf = gpd.read_file(path)
+    if gdf.crs is not None:
+        gdf = gdf.to_crs(4326)
+
+    return gdf.unary_union
+
+
+def _init_worker(memory_limit, cache_dir, pipeline_args, pipeline_kwargs):
+    """Limit the worker memory and build its pipeline.
+
+    Args:
+        memory_limit (int): maximum address space of the worker in bytes, None for no limit
+        cache_dir (str, Path): directory of the disk cache, None to disable it
+        pipeline_args (tuple): positional arguments of the Pipeline
+        pipeline_kwargs (dict): keyword arguments of the Pipeline
+    """
+    global _pipeline
+
+    if memory_limit:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    disk_cache = DiskCache(cache_dir) if cache_dir else None
+
+    _pipeline = Pipeline(*pipeline_args, disk_cache=disk_cache, **pipeline_kwargs)
+
+
+def _run_tile(lat, lon, years, outputs, block_rows=None):
+    """Run the worker pipeline over a single tile."""
+    try:
+        _pipeline.run(lat, lon, years, outputs, block_rows=block_rows)
+    finally:
+        # Release the tiles before the next one, the worker only keeps one at a time
+        _pipeline.tile_cache.clear()
+        _pipeline.change_manager.clear()
+
+
+def run_batch(
+    tiles,
+    years,
+    outputs,
+    data_dir,
+    output_dir,
+    parameter_file,
+    cache_dir=None,
+    workers=None,
+    memory_limit=None,
+    block_rows=None,
+    load_workers=2,
+    **options,
+):
+    """Compute and write the outputs of many tiles in a pool of processes.
+
+    Every tile is processed by a single worker, from loading to writing, so
+    the workers never share arrays. The mosaics have to be available in
+    data_dir.
+
+    Args:
+        tiles (list): (lat, lon) upper-left corners of the tiles
+        years (list): one year, or two years to compute the change outputs
+        outputs (list): names of the outputs, see pipeline.OUTPUTS values
+        data_dir (str, Path): directory with the decompressed ALOS mosaics
+        output_dir (str, Path): directory where the outputs are written
+        parameter_file (str, Path): biota calibration parameter file
+        cache_dir (str, Path): directory of the disk cache, None to disable it
+        workers (int): number of worker processes, defaults to the number of CPUs
+        memory_limit (int): maximum memory of each worker in bytes, None for no limit
+        block_rows (int): compute the outputs by windows of block_rows rows, see Pipeline.run
+        load_workers (int): years of a tile loaded or filtered at once by each worker
+        options: optional parameters and aoi of the pipeline
+
+    Returns:
+        (dict): exception raised by each failed tile, keyed by (lat, lon)
+
+    Example:
+        tiles = tiles_from_bounds(-75.5, -2.5, -72.5, 0.5)
+        failed = run_batch(tiles, [2016], ["Biomass"], data_dir, output_dir, parameter_file, workers=4)
+    """
+    workers = workers or multiprocessing.cpu_count()
+    initargs = (
+        memory_limit,
+        cache_dir,
+        (data_dir, output_dir, parameter_file),
+        {"load_workers": load_workers, **options},
+    )
+
+    args = (years, outputs, block_rows)
+    failed = {}
+
+    # Avoid the pool overhead when there is a single worker
+    if workers == 1:
+        _init_worker(None, *initargs[1:])
+        for lat, lon in tiles:
+            try:
+                _run_tile(lat, lon, *args)
+            except Exception as e:
+                logger.exception(f"Processing failed for lat: {lat}, lon: {lon}")
+                failed[(lat, lon)] = e
+
+        return failed
+
+    # spawn the workers, forking a kernel with running threads is not safe
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=initargs,
+    ) as executor:
+        futures = {
+            executor.submit(_run_tile, lat, lon, *args): (lat, lon)
+            for lat, lon in tiles
+        }
+
+        for i, future in enumerate(as_completed(futures), 1):
+            lat, lon = futures[future]
+            try:
+                future.result()
+                logger.info(f"[{i}/{len(tiles)}] Done lat: {lat}, lon: {lon}")
+            except Exception as e:
+                logger.error(
+                    f"[{i}/{len(tiles)}] Processing failed for lat: {lat}, lon: {lon}: {e!r}"
+                )
+                failed[(lat, lon)] = e
+
+    return failed
+
+
+def run_large_tile(
+    lat, lon, years, outputs, data_dir, output_dir, parameter_file, **kwargs
+):
+    """Compute the outputs of a 5x5 tile and mosaic them.
+
+    The 1x1 tiles extracted from the 5x5 archive are processed in parallel
+    by run_batch, then the outputs of each 1x1 tile are mosaicked into a
+    single Cloud-Optimized GeoTIFF through a VRT.
+
+    Args:
+        lat (int): latitude of the 5x5 tile upper-left corner
+        lon (int): longitude of the 5x5 tile upper-left corner
+        years (list): one year, or two years to compute the change outputs
+        outputs (list): names of the outputs, see pipeline.OUTPUTS values
+        data_dir (str, Path): directory with the decompressed ALOS mosaics
+        output_dir (str, Path): directory where the mosaics are written
+        parameter_file (str, Path): biota calibration parameter file
+        kwargs: other arguments of run_batch, an aoi clips the outputs
+
+    Returns:
+        (tuple): path of each output mosaic keyed by output name, and the
+            exception raised by each failed 1x1 tile keyed by (lat, lon)
+    """
+    from .writer import mosaic
+
+    # Tiles over the sea are not in the archives, use the ones of every year
+    catalogue = TileCatalogue(data_dir)
+    tiles = [
+        tile
+        for tile in sub_tiles(lat, lon)
+        if all(tile in (catalogue.tiles(lat, lon, year, True) or []) for year in years)
+    ]
+
+    # Only the tiles intersecting the AOI, if any, are computed
+    aoi = kwargs.get("aoi")
+    if aoi is not None:
+        intersecting = tiles_from_geometry(aoi)
+        tiles = [tile for tile in tiles if tile in intersecting]
+
+    if not tiles:
+        raise ValueError(f"No 1x1 tile of the 5x5 tile lat: {lat}, lon: {lon} found.")
+
+    failed = run_batch(
+        tiles, years, outputs, data_dir, output_dir, parameter_file, **kwargs
+    )
+    done = [tile for tile in tiles if tile not in failed]
+    if not done:
+        return {}, failed
+
+    clipped = aoi is not None
+    paths = {}
+    for name in outputs:
+        paths[name] = mosaic(
+            [
+                Path(output_dir) / output_filename(name, *tile, years, aoi=clipped)
+                for tile in done
+            ],
+            Path(output_dir) / output_filename(name, lat, lon, years, True, clipped),
+            categorical=name in CATEGORICAL_OUTPUTS,
+        )
+        logger.info(f"{name} mosaic written in {paths[name]}")
+
+    return paths, failed
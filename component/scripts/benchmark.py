@@ -0,0 +1,247 @@
+"""Time each stage of the biota pipeline over synthetic ALOS tiles.
+
+Example:
+    python -m component.scripts.benchmark --size 1125 --downsample-factors 1 2 \
+        --window-sizes 3 5 7 --output benchmark.json
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .display import get_preset, render, tile_bounds
+from .download import tile_name
+from .pipeline import Pipeline
+from .pyramid import Pyramid
+
+try:
+    from osgeo import gdal, osr
+except ImportError:
+    import gdal
+    import osr
+
+# Stages timed for each set of parameters, in the order they run
+STAGES = [
+    "load",
+    "gamma0",
+    "agb",
+    "woody_cover",
+    "change",
+    "change_type",
+    "write",
+    "display",
+]
+
+
+def write_raster(path, array, geo_t, dtype):
+    """Write a single band GeoTIFF in EPSG:4326."""
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+
+    driver = gdal.GetDriverByName("GTiff")
+    ds = driver.Create(str(path), array.shape[1], array.shape[0], 1, dtype)
+    ds.SetGeoTransform(geo_t)
+    ds.SetProjection(srs.ExportToWkt())
+    ds.GetRasterBand(1).WriteArray(array)
+    ds = None
+
+
+def make_tile(data_dir, lat, lon, year, size=1125, clearing=False, seed=0):
+    """Write a synthetic ALOS mosaic tile laid out as biota.LoadTile expects it.
+
+    The backscatter follows a smooth forest pattern with speckle, and the
+    south-east corner of the tile is masked as if it was over the sea.
+
+    Args:
+        data_dir (str, Path): directory of the mosaics
+        lat (int): latitude of the tile upper-left corner
+        lon (int): longitude of the tile upper-left corner
+        year (int): year of the mosaic
+        size (int): number of pixels of each side of the tile, 4500 for a real one
+        clearing (bool): clear the forest of the north-west quarter, to get some change
+        seed (int): seed of the forest pattern, use the same one for every year
+
+    Returns:
+        (Path): directory of the tile
+    """
+    rng = np.random.default_rng(seed)
+
+    # Smooth forest pattern, from a coarse random grid
+    coarse = rng.uniform(0, 1, (size // 75 + 1, size // 75 + 1))
+    forest = np.kron(coarse, np.ones((75, 75)))[:size, :size]
+
+    if clearing:
+        forest[: size // 4, : size // 4] = 0.05
+
+    # Gamma0 HV from about -25 dB (bare soil) to -12 dB (dense forest)
+    gamma0_db = -25 + 13 * forest
+
+    # Multiplicative speckle, with an independent draw for each year
+    speckle = np.random.default_rng(year).gamma(4, 1 / 4, (size, size))
+    gamma0_hv = 10 ** (gamma0_db / 10) * speckle
+    gamma0_hh = gamma0_hv * 10**0.6
+
+    # Invert the ALOS calibration, gamma0 = 10 * log10(DN ** 2) - 83
+    def to_dn(gamma0):
+        dn = np.sqrt(gamma0 * 10 ** (83 / 10))
+        return np.clip(dn, 1, 65535).astype(np.uint16)
+
+    mask = np.full((size, size), 255, dtype=np.uint8)
+    mask[size * 3 // 4 :, size * 3 // 4 :] = 0
+
+    days = 365 * (year - 2014) + rng.integers(150, 250, (size, size))
+    date = days.astype(np.uint16)
+
+    yy = str(year)[-2:]
+    suffix = "_F02DAR" if year >= 2015 else ""
+    name = tile_name(lat, lon)
+
+    directory = Path(data_dir) / f"{name}_{yy}_MOS{suffix}"
+    directory.mkdir(parents=True, exist_ok=True)
+
+    geo_t = (lon, 1 / size, 0, lat, 0, -1 / size)
+    rasters = {
+        "sl_HH": (to_dn(gamma0_hh), gdal.GDT_UInt16),
+        "sl_HV": (to_dn(gamma0_hv), gdal.GDT_UInt16),
+        "mask": (mask, gdal.GDT_Byte),
+        "date": (date, gdal.GDT_UInt16),
+    }
+    for member, (array, dtype) in rasters.items():
+        write_raster(directory / f"{name}_{yy}_{member}{suffix}", array, geo_t, dtype)
+
+    return directory
+
+
+def timed(timings, stage, func, *args, **kwargs):
+    """Call a function and record its wall time in seconds."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings[stage] = round(time.perf_counter() - start, 4)
+
+    return result
+
+
+def benchmark(pipeline, lat, lon, years):
+    """Time each stage of a pipeline over a pair of tiles.
+
+    Every stage starts from the results of the previous ones, the pipeline
+    shouldn't use any disk cache.
+
+    Returns:
+        (dict): wall time of each stage in seconds, see STAGES
+    """
+    timings = {}
+
+    tiles = timed(
+        timings, "load", lambda: [pipeline.load_tile(lat, lon, y) for y in years]
+    )
+    timed(timings, "gamma0", pipeline.get_gamma0, tiles[0])
+    agb = timed(timings, "agb", lambda: [pipeline.get_agb(t) for t in tiles])[0]
+    timed(timings, "woody_cover", lambda: [pipeline.get_woody_cover(t) for t in tiles])
+    change = timed(timings, "change", pipeline.get_change_tile, *tiles)
+    timed(timings, "change_type", change.getChangeType)
+    timed(timings, "write", pipeline.write, "Biomass", agb, tiles[0])
+
+    # Render the whole tile, then a zoomed-in viewport, as in the map display
+    def display():
+        pyramid = Pyramid(agb, tiles[0].geo_t)
+        _, _, vmin, vmax, cmap = get_preset("Biomass")
+        (south, west), (north, east) = tile_bounds(pyramid.geo_t, pyramid.shape)
+        render(pyramid, ((south, west), (north, east)), 8, vmin, vmax, cmap)
+        corner = ((north - 0.1, west), (north, west + 0.1))
+        render(pyramid, corner, 13, vmin, vmax, cmap)
+
+    timed(timings, "display", display)
+
+    return timings
+
+
+def get_parser():
+    """Return the command line parser."""
+    parser = argparse.ArgumentParser(
+        description="Time each stage of the biota pipeline over synthetic ALOS tiles."
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=1125,
+        help="Number of pixels of each side of the synthetic tiles, 4500 for a real one.",
+    )
+    parser.add_argument("--downsample-factors", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--window-sizes", type=int, nargs="+", default=[3, 5, 7])
+    parser.add_argument("--output", type=Path, default=Path("benchmark.json"))
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="Directory of the synthetic tiles and outputs, a temporary one by default.",
+    )
+    parser.add_argument("--parameter-file", type=Path)
+
+    return parser
+
+
+def main(argv=None):
+    """Generate the synthetic tiles, time the pipeline and write the results."""
+    args = get_parser().parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    if args.parameter_file is None:
+        from ..parameter.file_params import parameter_file
+
+        args.parameter_file = parameter_file
+
+    lat, lon, years = 0, -75, [2016, 2017]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or Path(tmp_dir)
+        data_dir, output_dir = work_dir / "data", work_dir / "outputs"
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        logging.info(f"Writing synthetic {args.size}x{args.size} tiles...")
+        for i, year in enumerate(years):
+            make_tile(data_dir, lat, lon, year, size=args.size, clearing=i > 0)
+
+        runs = []
+        for downsample_factor in args.downsample_factors:
+            for window_size in args.window_sizes:
+                params = {
+                    "downsample_factor": downsample_factor,
+                    "window_size": window_size,
+                    "lee_filter": True,
+                }
+                logging.info(f"Timing {params}...")
+
+                pipeline = Pipeline(data_dir, output_dir, args.parameter_file, **params)
+                timings = benchmark(pipeline, lat, lon, years)
+                total = round(sum(timings.values()), 4)
+                stages = {stage: timings[stage] for stage in STAGES}
+                runs.append({**params, "stages": stages, "total": total})
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": multiprocessing.cpu_count(),
+            "numpy": np.__version__,
+            "gdal": gdal.__version__,
+        },
+        "size": args.size,
+        "years": years,
+        "runs": runs,
+    }
+    args.output.write_text(json.dumps(results, indent=4))
+    logging.info(f"Results written in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
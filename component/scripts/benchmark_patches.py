@@ -0,0 +1,138 @@
+"""Compare the patch filtering of biota with the block labelling of patches.py.
+
+Both run over the same synthetic woody cover, fragmented in many small
+patches and partly masked, for each contiguity and minimum patch size. Their
+outputs are checked to be identical.
+
+Example:
+    python -m component.scripts.benchmark_patches --size 4500 --min-pixels 1 16 160 \
+        --output benchmark_patches.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .patches import biota_contiguous_areas, contiguous_areas
+
+
+def make_woody_cover(size=4500, forest=0.5, seed=0):
+    """Return a synthetic woody cover with many small patches.
+
+    The forest density follows a smooth pattern from a coarse random grid,
+    each pixel is then drawn from it, as the speckle of the AGB does. The
+    south-east corner is masked as if it was over the sea.
+
+    Args:
+        size (int): number of pixels of each side, 4500 for a full tile
+        forest (float): mean proportion of forest pixels
+        seed (int): seed of the random draws
+
+    Returns:
+        (np.ma.MaskedArray): True over forest pixels
+    """
+    rng = np.random.default_rng(seed)
+
+    coarse = rng.uniform(0, 2 * forest, (size // 75 + 1, size // 75 + 1))
+    density = np.kron(coarse, np.ones((75, 75)))[:size, :size]
+
+    mask = np.zeros((size, size), dtype=bool)
+    mask[size * 3 // 4 :, size * 3 // 4 :] = True
+
+    return np.ma.array(rng.random((size, size)) < density, mask=mask)
+
+
+def timed(func, *args, **kwargs):
+    """Call a function and return its result and wall time in seconds."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+
+    return result, round(time.perf_counter() - start, 4)
+
+
+def identical(outputs, other):
+    """Check that two outputs of getContiguousAreas have the same values and mask."""
+    return all(
+        a.dtype == b.dtype
+        and np.array_equal(np.ma.getdata(a), np.ma.getdata(b))
+        and np.array_equal(np.ma.getmaskarray(a), np.ma.getmaskarray(b))
+        for a, b in zip(outputs, other)
+    )
+
+
+def get_parser():
+    """Return the command line parser."""
+    parser = argparse.ArgumentParser(
+        description="Compare the patch filtering of biota with the block labelling."
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=4500,
+        help="Number of pixels of each side of the woody cover, 4500 for a full tile.",
+    )
+    parser.add_argument("--min-pixels", type=int, nargs="+", default=[1, 16, 160])
+    parser.add_argument(
+        "--contiguity", nargs="+", choices=["rook", "queen"], default=["rook", "queen"]
+    )
+    parser.add_argument("--output", type=Path, default=Path("benchmark_patches.json"))
+
+    return parser
+
+
+def main(argv=None):
+    """Time both implementations, write the results and return 1 if they differ."""
+    args = get_parser().parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    logging.info(f"Drawing a synthetic {args.size}x{args.size} woody cover...")
+    woody_cover = make_woody_cover(args.size)
+    biota_func = biota_contiguous_areas()
+
+    runs = []
+    for contiguity in args.contiguity:
+        for min_pixels in args.min_pixels:
+            params = {"contiguity": contiguity, "min_pixels": min_pixels}
+            logging.info(f"Timing {params}...")
+
+            expected, biota_time = timed(biota_func, woody_cover, True, **params)
+            outputs, blocks_time = timed(contiguous_areas, woody_cover, True, **params)
+
+            runs.append(
+                {
+                    **params,
+                    "biota": biota_time,
+                    "blocks": blocks_time,
+                    "speedup": round(biota_time / blocks_time, 2),
+                    "patches": int(outputs[1].max()),
+                    "identical": identical(outputs, expected),
+                }
+            )
+            logging.info(runs[-1])
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+        },
+        "size": args.size,
+        "runs": runs,
+    }
+    args.output.write_text(json.dumps(results, indent=4))
+    logging.info(f"Results written in {args.output}")
+
+    return int(not all(run["identical"] for run in runs))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
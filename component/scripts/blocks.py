@@ -0,0 +1,193 @@
+import numpy as np
+
+from .writer import NODATA, gdal_dtype, to_raster_array
+
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+
+def iter_windows(n_rows, block_rows, halo=0):
+    """Split the rows of a tile in windows surrounded by a halo.
+
+    Args:
+        n_rows (int): number of rows of the tile
+        block_rows (int): number of rows of each window
+        halo (int): number of extra rows read above and below each window
+
+    Yields:
+        (tuple): first row and number of rows of the window, first and last
+            (excluded) rows of the window with its halo
+    """
+    for row in range(0, n_rows, block_rows):
+        nrows = min(block_rows, n_rows - row)
+        yield row, nrows, max(0, row - halo), min(n_rows, row + nrows + halo)
+
+
+def _rebin_sum(array, factor):
+    """Sum the array over factor x factor blocks, padding the edges with zeros."""
+    pad_y, pad_x = (-array.shape[0]) % factor, (-array.shape[1]) % factor
+    array = np.pad(array, ((0, pad_y), (0, pad_x)))
+    y, x = array.shape
+
+    return array.reshape(y // factor, factor, x // factor, factor).sum(axis=(1, 3))
+
+
+def read_dn(tile, polarisation, top, bottom, left=0, right=None, mask=None):
+    """Read the DN of a window of a tile, downsampled like biota does.
+
+    Args:
+        tile (biota.LoadTile): tile to read
+        polarisation (str): 'HH' or 'HV'
+        top (int): first row, in downsampled pixels
+        bottom (int): last (excluded) row, in downsampled pixels
+        left (int): first column, in downsampled pixels
+        right (int): last (excluded) column, in downsampled pixels, the last
+            column of the tile by default
+        mask (np.ndarray): mask of the window, defaults to the tile mask
+
+    Returns:
+        (np.ma.MaskedArray): DN of the window, masked with the mask
+    """
+    factor = tile.downsample_factor
+    right = tile.xSize if right is None else right
+    path = tile.HV_path if polarisation == "HV" else tile.HH_path
+    mask = tile.mask[top:bottom, left:right] if mask is None else mask
+
+    ds = gdal.Open(path)
+    y_off, x_off = top * factor, left * factor
+    y_size = min(bottom * factor, ds.RasterYSize) - y_off
+    x_size = min(right * factor, ds.RasterXSize) - x_off
+    dn = ds.GetRasterBand(1).ReadAsArray(x_off, y_off, x_size, y_size)
+    ds = None
+
+    # Take the mean DN of the unmasked pixels of each block, as in biota.LoadTile.getDN
+    if factor != 1:
+        mask_ds = gdal.Open(tile.mask_path)
+        band = mask_ds.GetRasterBand(1)
+        masked = band.ReadAsArray(x_off, y_off, x_size, y_size)
+        mask_ds = None
+
+        shape = (bottom - top, right - left)
+        dn_sum = _rebin_sum(dn.astype(np.float64), factor)[: shape[0], : shape[1]]
+        block_sum = _rebin_sum(np.ones_like(dn), factor)[: shape[0], : shape[1]]
+        mask_sum = _rebin_sum(masked != 255, factor)[: shape[0], : shape[1]]
+
+        dn = np.zeros(shape, dtype=dn.dtype)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dn[~mask] = (dn_sum[~mask] / (block_sum - mask_sum)[~mask]).astype(int)
+
+    return np.ma.array(dn, mask=mask)
+
+
+def block_tile(tile, top, bottom, left=0, right=None, inside=None):
+    """Return a copy of a biota tile restricted to a window.
+
+    The copy keeps the tile parameters but none of its arrays, and reads
+    its DN from the window of the mosaic only. All the biota methods (Gamma0,
+    AGB, woody cover, change) then run over the window as over a whole tile.
+    A window of a window reads from the mosaic of the whole tile.
+
+    Args:
+        tile (biota.LoadTile): the whole tile, or a window of it
+        top (int): first row, in downsampled pixels
+        bottom (int): last (excluded) row, in downsampled pixels
+        left (int): first column, in downsampled pixels
+        right (int): last (excluded) column, in downsampled pixels, the last
+            column of the tile by default
+        inside (np.ndarray): pixels of the window to keep, the others are masked
+    """
+    right = tile.xSize if right is None else right
+
+    # Position of the window in the whole tile
+    source = getattr(tile, "source", tile)
+    row, col = getattr(tile, "offset", (0, 0))
+
+    block = object.__new__(type(tile))
+    block.__dict__.update(
+        {k: v for k, v in vars(tile).items() if not isinstance(v, np.ndarray)}
+    )
+
+    geo_t = list(tile.geo_t)
+    geo_t[0] += left * geo_t[1]
+    geo_t[3] += top * geo_t[5]
+
+    block.geo_t = tuple(geo_t)
+    block.ySize = bottom - top
+    block.xSize = right - left
+    block.mask = tile.mask[top:bottom, left:right]
+    if inside is not None:
+        block.mask = block.mask | ~inside
+
+    block.source = source
+    block.offset = (row + top, col + left)
+    block.getDN = lambda polarisation="HV", **kwargs: read_dn(
+        source,
+        polarisation,
+        row + top,
+        row + bottom,
+        col + left,
+        col + right,
+        mask=block.mask,
+    )
+
+    return block
+
+
+def stream_to_geotiff(
+    tiles, compute, path, nodata=None, block_rows=256, halo=0, options=None
+):
+    """Compute an output window by window and write each one straight to a GeoTIFF.
+
+    Only one window of each tile is in memory at a time, so the peak memory
+    depends on block_rows and not on the size of the tile. The data type of
+    the file is picked from the first window.
+
+    Args:
+        tiles (list): biota tiles used by compute, the first one gives the georeference
+        compute (callable): function computing the output from the block tiles
+        path (str, Path): path of the output file
+        nodata (dict): nodata value by gdal data type, defaults to writer.NODATA
+        block_rows (int): number of rows of each window
+        halo (int): extra rows needed around each window, e.g. by the Lee filter
+        options (list): creation options of the GTiff driver
+
+    Returns:
+        (Path): path of the output file
+    """
+    tile = tiles[0]
+    nodata = nodata or NODATA
+    options = options or ["TILED=YES", "COMPRESS=LZW", "BIGTIFF=IF_SAFER"]
+
+    ds = band = None
+    for row, nrows, top, bottom in iter_windows(tile.ySize, block_rows, halo):
+        # Windows without any valid pixel, e.g. outside the AOI, are left to nodata
+        if tile.mask[row : row + nrows].all():
+            continue
+
+        array = compute(*[block_tile(t, top, bottom) for t in tiles])
+
+        # Drop the halo before writing
+        array = array[row - top : row - top + nrows]
+
+        if ds is None:
+            dtype = gdal_dtype(array)
+            driver = gdal.GetDriverByName("GTiff")
+            ds = driver.Create(
+                str(path), tile.xSize, tile.ySize, 1, dtype, options=options
+            )
+            ds.SetGeoTransform(tile.geo_t)
+            ds.SetProjection(tile.proj)
+            band = ds.GetRasterBand(1)
+            band.SetNoDataValue(nodata[dtype])
+
+        band.WriteArray(to_raster_array(array, dtype, nodata[dtype]), 0, row)
+
+    if ds is None:
+        raise ValueError("The tile has no valid pixel.")
+
+    band.FlushCache()
+    ds = None
+
+    return path
@@ -0,0 +1,331 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .patches import install
+
+
+class ChangeTileManager:
+    def __init__(self):
+        """Keep a single biota.LoadChange object per pair of tiles and change parameters.
+
+        Computing a change tile runs the whole change detection over both
+        years, so every change output (biomass change, change type and
+        deforestation risk) has to be served from the same object. It's
+        computed again when the woody cover of a tile changed.
+
+        The change tile can be requested and cleared from several threads,
+        e.g. a run in the background and the widgets.
+
+        Example:
+            manager = ChangeTileManager()
+            change_tile = manager.get(tile_1, tile_2, 2, 15, "queen")
+
+            # This call won't compute the change again
+            change_tile = manager.get(tile_1, tile_2, 2, 15, "queen")
+        """
+        self.tiles = None
+        self.params = None
+        self.change_tile = None
+
+        self.lock = threading.Lock()
+
+    def get(
+        self,
+        tile_1,
+        tile_2,
+        change_area_threshold,
+        change_magnitude_threshold,
+        contiguity,
+    ):
+        """Return the change tile for the given tiles, building it only if needed.
+
+        Args:
+            tile_1 (biota.LoadTile): tile of the first year
+            tile_2 (biota.LoadTile): tile of the second year
+            change_area_threshold (int): minimum change area (ha)
+            change_magnitude_threshold (int): minimum absolute AGB change (tC/ha)
+            contiguity (str): 'rook' or 'queen'
+        """
+        params = (change_area_threshold, change_magnitude_threshold, contiguity)
+
+        with self.lock:
+            if self._is_cached(tile_1, tile_2, params):
+                return self.change_tile
+
+        # Compute the intermediate arrays once, biota keeps them in the tiles
+        # and every change output will read them from there
+        for tile in [tile_1, tile_2]:
+            tile.getAGB()
+            tile.getWoodyCover()
+
+        import biota
+
+        # Change patches are filtered with the faster labelling too
+        install()
+
+        change_tile = biota.LoadChange(
+            tile_1,
+            tile_2,
+            change_area_threshold=change_area_threshold,
+            change_magnitude_threshold=change_magnitude_threshold,
+            contiguity=contiguity,
+        )
+
+        with self.lock:
+            # The woody cover of a tile is recomputed when its thresholds change
+            self.tiles = (tile_1, tile_2, tile_1.WoodyCover, tile_2.WoodyCover)
+            self.params = params
+            self.change_tile = change_tile
+
+        return change_tile
+
+    def clear(self):
+        """Drop the current change tile."""
+        with self.lock:
+            self.tiles = self.params = self.change_tile = None
+
+    def _is_cached(self, tile_1, tile_2, params):
+        """Check if the stored change tile was built from the same inputs."""
+        if self.change_tile is None:
+            return False
+
+        inputs = (
+            tile_1,
+            tile_2,
+            vars(tile_1).get("WoodyCover"),
+            vars(tile_2).get("WoodyCover"),
+        )
+        same_inputs = all(a is b for a, b in zip(self.tiles, inputs))
+
+        return same_inputs and self.params == params
+
+
+class TileCache:
+    def __init__(self, maxsize=2):
+        """Least recently used cache of biota.LoadTile objects.
+
+        Tiles are keyed on the whole set of arguments used to build them, so
+        loading the same tile twice will only read and filter the mosaic once.
+        As biota keeps the computed arrays within the tile, the cached tiles
+        will also keep their Gamma0, AGB and woody cover.
+
+        Args:
+            maxsize (int): maximum number of tiles kept in memory
+
+        Example:
+            cache = TileCache(maxsize=2)
+            tile = cache.get(data_dir, lat, lon, 2016, lee_filter=True)
+
+            # This call won't load the tile again
+            tile = cache.get(data_dir, lat, lon, 2016, lee_filter=True)
+        """
+        self.maxsize = maxsize
+        self.tiles = OrderedDict()
+
+        # Tiles of different years can be loaded from several threads
+        self.lock = threading.Lock()
+
+    def get(self, *args, **kwargs):
+        """Return the tile built with the given arguments, load it if not cached.
+
+        Args:
+            *args: positional arguments of biota.LoadTile
+            **kwargs: keyword arguments of biota.LoadTile
+        """
+        key = (args, tuple(sorted(kwargs.items())))
+
+        with self.lock:
+            if key in self.tiles:
+                self.tiles.move_to_end(key)
+                return self.tiles[key]
+
+        import biota
+
+        # The woody cover of the tile filters its patches with the faster labelling
+        install()
+
+        # Don't hold the lock while loading, other tiles can load meanwhile
+        tile = biota.LoadTile(*args, **kwargs)
+
+        with self.lock:
+            self.tiles[key] = tile
+            while len(self.tiles) > self.maxsize:
+                self.tiles.popitem(last=False)
+
+        return tile
+
+    def clear(self):
+        """Drop all the cached tiles."""
+        with self.lock:
+            self.tiles.clear()
+
+
+def file_checksum(path):
+    """Return the md5 checksum of a file.
+
+    Args:
+        path (str, Path): path of the file
+    """
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            md5.update(chunk)
+
+    return md5.hexdigest()
+
+
+class DiskCache:
+
+    # Increase it when the stored format changes, older files will be ignored
+    version = 1
+
+    def __init__(self, cache_dir, max_size=20 * 2**30):
+        """Persistent cache of derived arrays (Gamma0, AGB, woody cover...).
+
+        Each array is stored as memory-mappable .npy files (data and mask)
+        with a json sidecar describing the inputs used to compute it. The
+        files are named after a hash of those inputs, so a later session with
+        the same parameters will read the array instead of computing it.
+
+        Every threshold tried in the UI stores a new woody cover, so the least
+        recently used arrays are removed once the cache exceeds max_size.
+
+        Args:
+            cache_dir (str, Path): directory where the arrays are stored
+            max_size (int): maximum size of the cache in bytes
+
+        Example:
+            cache = DiskCache(cache_dir)
+            params = {"lat": 0, "lon": -75, "year": 2016, "lee_filter": True}
+
+            agb = cache.load("AGB", params)
+            if agb is None:
+                agb = tile.getAGB()
+                cache.save("AGB", params, agb)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+
+        # Arrays can be saved from several threads
+        self.lock = threading.Lock()
+
+    def key(self, name, params):
+        """Return the hash identifying an array computed with the given params."""
+        content = json.dumps(
+            {"name": name, "version": self.version, "params": params},
+            sort_keys=True,
+            default=str,
+        )
+
+        return hashlib.sha1(content.encode()).hexdigest()
+
+    def _paths(self, name, params):
+        """Return the data, mask and sidecar paths of an array."""
+        stem = self.cache_dir / f"{name}_{self.key(name, params)}"
+
+        return (
+            stem.with_suffix(".npy"),
+            stem.with_name(f"{stem.name}_mask.npy"),
+            stem.with_suffix(".json"),
+        )
+
+    def load(self, name, params):
+        """Return the cached masked array or None if it was never stored.
+
+        The data is memory mapped in copy-on-write mode, so it's only read
+        from the disk when needed and it can be safely modified in memory.
+
+        Args:
+            name (str): name of the derived array
+            params (dict): inputs used to compute the array
+        """
+        data_path, mask_path, sidecar_path = self._paths(name, params)
+
+        # The sidecar is written last, if it's missing the entry is incomplete
+        if not sidecar_path.exists():
+            return None
+
+        try:
+            data = np.load(data_path, mmap_mode="c")
+            mask = np.load(mask_path, mmap_mode="c")
+
+            # The sidecar modification time orders the arrays for the eviction
+            os.utime(sidecar_path)
+        except (OSError, ValueError):
+            return None
+
+        return np.ma.MaskedArray(data, mask=mask)
+
+    def save(self, name, params, array):
+        """Store an array and its sidecar in the cache.
+
+        Args:
+            name (str): name of the derived array
+            params (dict): inputs used to compute the array
+            array (np.ndarray, np.ma.MaskedArray): array to store
+        """
+        data_path, mask_path, sidecar_path = self._paths(name, params)
+
+        for path, content in [
+            (data_path, np.ma.getdata(array)),
+            (mask_path, np.ma.getmaskarray(array)),
+        ]:
+            # Write in a temporary file, so a killed kernel won't leave a
+            # truncated array behind
+            tmp_path = path.with_name(f".{path.name}")
+            with open(tmp_path, "wb") as f:
+                np.save(f, content)
+            os.replace(tmp_path, path)
+
+        sidecar = {
+            "name": name,
+            "version": self.version,
+            "key": self.key(name, params),
+            "params": params,
+            "dtype": str(np.ma.getdata(array).dtype),
+            "shape": list(np.shape(array)),
+        }
+        sidecar_path.write_text(json.dumps(sidecar, indent=2, default=str))
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used arrays until the cache fits max_size."""
+        with self.lock:
+            entries = []
+            for sidecar_path in self.cache_dir.glob("*.json"):
+                paths = [
+                    sidecar_path,
+                    sidecar_path.with_suffix(".npy"),
+                    sidecar_path.with_name(f"{sidecar_path.stem}_mask.npy"),
+                ]
+                try:
+                    used = sidecar_path.stat().st_mtime
+                    size = sum(path.stat().st_size for path in paths if path.exists())
+                except OSError:
+                    # Removed meanwhile by another process
+                    continue
+                entries.append((used, size, paths))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, paths in sorted(entries, key=lambda entry: entry[0]):
+                if total <= self.max_size:
+                    break
+
+                # Remove the sidecar first, so the entry is never seen incomplete
+                for path in paths:
+                    path.unlink(missing_ok=True)
+                total -= size
+
+    def clear(self):
+        """Remove all the cached arrays."""
+        for path in self.cache_dir.glob("*"):
+            if path.suffix in [".npy", ".json"]:
+                path.unlink()
@@ -0,0 +1,255 @@
+"""Command line entry point to run the biota pipeline without the user interface.
+
+Example:
+    python -m component.scripts.cli --tile=0,-75 --tile=-1,-75 --years 2016 2017 \
+        --outputs biomass forest_ch --lee-filter --window-size 5
+
+    python -m component.scripts.cli --bbox -76 -3 -72 1 --years 2016 \
+        --outputs biomass --workers 4 --memory-limit 8
+"""
+
+import argparse
+import logging
+import os
+from pathlib import Path
+
+from .batch import read_geometry, run_batch, tiles_from_bounds, tiles_from_geometry
+from .download import DownloadScheduler, download_and_extract
+from .pipeline import OPTIONS, OUTPUTS
+from .profiling import PROFILE_ENV
+from .scripts import round_
+
+# Type of the numeric options, the thresholds accept decimals whatever the default
+OPTION_TYPES = {
+    "downsample_factor": int,
+    "window_size": int,
+    "forest_threshold": float,
+    "area_threshold": float,
+    "change_area_threshold": float,
+    "change_magnitude_threshold": float,
+}
+
+
+def coordinates(value):
+    """Parse a "lat,lon" pair into the upper-left corner of its 1x1 tile."""
+    try:
+        lat, lon = (float(c) for c in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a 'lat,lon' pair.")
+
+    if not -90 <= lat <= 90:
+        raise argparse.ArgumentTypeError("Latitude must be between -90 and 90 degrees.")
+    if not -180 <= lon <= 180:
+        raise argparse.ArgumentTypeError(
+            "Longitude must be between -180 and 180 degrees."
+        )
+
+    return round_(lat, 1, "lat"), round_(lon, 1, "lon")
+
+
+def log_download(request, status, **info):
+    """Log the status changes of the downloads."""
+    lat, lon, year = request
+    message = f"Download {status} for year {year}, lat: {lat}, lon: {lon}"
+
+    if "error" in info:
+        message += f": {info['error']}"
+
+    logging.info(message)
+
+
+def get_parser():
+    """Return the command line parser."""
+    from ..parameter import cache_dir, data_dir, output_dir, parameter_file
+
+    parser = argparse.ArgumentParser(
+        description="Compute biota outputs over ALOS mosaic tiles without the user interface."
+    )
+
+    area = parser.add_argument_group("Area").add_mutually_exclusive_group(required=True)
+    # A pair starting with "-" would be read as an option, it has to follow "="
+    area.add_argument(
+        "--tile",
+        dest="tiles",
+        metavar="LAT,LON",
+        type=coordinates,
+        action="append",
+        help="Coordinates of a tile to process, any point within a 1x1 degree tile. "
+        "Repeat it for several tiles, e.g. --tile=-15,35 --tile=-16,35.",
+    )
+    area.add_argument(
+        "--bbox",
+        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+        type=float,
+        nargs=4,
+        help="Process every 1x1 degree tile covering the bounding box.",
+    )
+    area.add_argument(
+        "--aoi",
+        metavar="FILE",
+        type=Path,
+        help="Process every 1x1 degree tile intersecting the polygons of a vector file.",
+    )
+    parser.add_argument(
+        "--clip",
+        action="store_true",
+        help="With --aoi, only compute the pixels within the polygons and crop the "
+        "outputs to them.",
+    )
+
+    required = parser.add_argument_group("Required arguments")
+    required.add_argument(
+        "--years",
+        metavar="Y",
+        type=int,
+        nargs="+",
+        required=True,
+        help="One year, or two years to compute the change outputs.",
+    )
+    required.add_argument(
+        "--outputs",
+        choices=list(OUTPUTS),
+        nargs="+",
+        required=True,
+        help="Outputs to compute and write.",
+    )
+
+    paths = parser.add_argument_group("Paths")
+    paths.add_argument("--data-dir", type=Path, default=data_dir)
+    paths.add_argument("--output-dir", type=Path, default=output_dir)
+    paths.add_argument("--cache-dir", type=Path, default=cache_dir)
+    paths.add_argument("--parameter-file", type=Path, default=parameter_file)
+    paths.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't read or store derived arrays in the cache directory.",
+    )
+    paths.add_argument(
+        "--no-download",
+        action="store_true",
+        help="Only use the mosaics already available in the data directory.",
+    )
+    paths.add_argument(
+        "--download-workers",
+        type=int,
+        default=4,
+        help="Maximum number of simultaneous downloads.",
+    )
+
+    batch = parser.add_argument_group("Batch")
+    batch.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of tiles processed in parallel, each one in its own process.",
+    )
+    batch.add_argument(
+        "--memory-limit",
+        metavar="GB",
+        type=float,
+        help="Maximum memory of each worker, a tile exceeding it will fail.",
+    )
+    batch.add_argument(
+        "--block-rows",
+        metavar="N",
+        type=int,
+        help="Compute the outputs by windows of N rows to bound the memory, when possible.",
+    )
+    batch.add_argument(
+        "--load-workers",
+        type=int,
+        default=2,
+        help="Number of years of a tile loaded or filtered at once by each worker.",
+    )
+
+    batch.add_argument(
+        "--profile",
+        metavar="FILE",
+        type=Path,
+        help="Append the time and memory used by each stage to a JSON lines file.",
+    )
+
+    optional = parser.add_argument_group("Optional parameters")
+    for name, default in OPTIONS.items():
+        flag = f"--{name.replace('_', '-')}"
+        if isinstance(default, bool):
+            optional.add_argument(
+                flag, action=argparse.BooleanOptionalAction, default=default
+            )
+        elif name == "contiguity":
+            optional.add_argument(flag, choices=["rook", "queen"], default=default)
+        elif name == "polarisation":
+            optional.add_argument(flag, choices=["HV", "HH"], default=default)
+        else:
+            optional.add_argument(flag, type=OPTION_TYPES[name], default=default)
+
+    return parser
+
+
+def main(argv=None):
+    """Download, decompress, compute and write the requested outputs."""
+    args = get_parser().parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    # The worker processes inherit the environment
+    if args.profile:
+        os.environ[PROFILE_ENV] = str(args.profile.resolve())
+
+    if args.clip and not args.aoi:
+        raise SystemExit("--clip requires --aoi.")
+    if len(args.years) > 2:
+        raise SystemExit("Select one or two years.")
+    if len(args.years) == 2 and args.years[0] >= args.years[1]:
+        raise SystemExit("Input Year 2 must be from a later year than Year 1.")
+
+    for path in [args.data_dir, args.output_dir]:
+        path.mkdir(parents=True, exist_ok=True)
+
+    aoi = read_geometry(args.aoi) if args.aoi else None
+
+    if args.bbox:
+        tiles = tiles_from_bounds(*args.bbox)
+    elif args.aoi:
+        tiles = tiles_from_geometry(aoi)
+    else:
+        tiles = args.tiles
+
+    logging.info(f"{len(tiles)} tile(s) to process")
+
+    if not args.no_download:
+        scheduler = DownloadScheduler(
+            args.data_dir,
+            max_workers=args.download_workers,
+            callback=log_download,
+        )
+        # Tiles over the sea have no mosaic, they will fail later on
+        download_and_extract(
+            scheduler,
+            [(lat, lon, year) for lat, lon in tiles for year in args.years],
+            callback=lambda archive: logging.info(f"Decompressing {archive.name}..."),
+        )
+
+    # A failing tile shouldn't stop the rest of the run
+    failed = run_batch(
+        tiles,
+        args.years,
+        [OUTPUTS[output] for output in args.outputs],
+        args.data_dir,
+        args.output_dir,
+        args.parameter_file,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        workers=args.workers,
+        memory_limit=int(args.memory_limit * 2**30) if args.memory_limit else None,
+        block_rows=args.block_rows,
+        load_workers=args.load_workers,
+        aoi=aoi if args.clip else None,
+        **{name: getattr(args, name) for name in OPTIONS},
+    )
+
+    if failed:
+        raise SystemExit(f"{len(failed)} tile(s) failed: {list(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import base64
+import io
+import math
+
+import numpy as np
+
+# Size of a web map tile in pixels, the map spans 256 * 2**zoom pixels
+TILE_SIZE = 256
+
+# Display parameters of each output: title, colorbar title, vmin, vmax, cmap
+PRESETS = {
+    "Gamma0": ("Gamma0 {polarisation}", "decibels", -20, -10, "Greys_r"),
+    "Biomass": ("AGB", "tC/ha", 0, 40, "YlGn"),
+    "Forest cover": ("Woody Cover", "decibels", 0, 1, "summer_r"),
+    "Biomass change": ("AGB Change", "tC/ha", -10, 10, "YlGn"),
+    "Change type": ("Change type", "Type", 1, 6, "Spectral"),
+    "Deforestation risk": ("Deforestation risk map", "Low - High risk", 0, 3, "autumn"),
+}
+
+# Outputs made of classes, rendered through a lookup table, with the classes
+# that are not displayed
+CATEGORICAL_DISPLAY = {
+    # Hide minor gain, minor loss, nonforest and nodata
+    "Change type": [0, 3, 4, 255],
+    "Deforestation risk": [],
+}
+
+
+def get_preset(name, polarisation="HV"):
+    """Return the display parameters of an output, see PRESETS.
+
+    Args:
+        name (str): name of the output
+        polarisation (str): polarisation shown in the Gamma0 title
+    """
+    title, cbartitle, vmin, vmax, cmap = PRESETS[name]
+
+    return title.format(polarisation=polarisation), cbartitle, vmin, vmax, cmap
+
+
+def categorical_lut(vmin, vmax, cmap, hidden=()):
+    """Return the RGBA colour of each of the 256 values of a byte array.
+
+    Args:
+        vmin (int): class mapped to the lower end of the colormap
+        vmax (int): class mapped to the upper end of the colormap
+        cmap (str): matplotlib colormap name
+        hidden (list): classes left transparent
+    """
+    import matplotlib.pyplot as plt
+
+    values = np.clip((np.arange(256) - vmin) / (vmax - vmin), 0, 1)
+    lut = plt.get_cmap(cmap)(values, bytes=True)
+    lut[list(hidden), 3] = 0
+
+    return lut
+
+
+def palette_lut(palette):
+    """Return the RGBA colour of each of the 256 values of a byte array.
+
+    Args:
+        palette (dict): matplotlib colour of each class, e.g. {1: "#1a9641", 2: "red"},
+            the other classes are transparent
+    """
+    from matplotlib.colors import to_rgba
+
+    lut = np.zeros((256, 4), dtype=np.uint8)
+    for value, color in palette.items():
+        # Negative classes of int8 arrays are read as their uint8 counterpart
+        lut[value % 256] = np.round(np.array(to_rgba(color)) * 255)
+
+    return lut
+
+
+def get_lut(name, palette=None):
+    """Return the lookup table of a categorical output, None for the other outputs.
+
+    Args:
+        name (str): name of the output
+        palette (dict): colour of each class replacing the preset, see palette_lut
+    """
+    if name not in CATEGORICAL_DISPLAY:
+        return None
+
+    if palette is not None:
+        return palette_lut(palette)
+
+    _, _, vmin, vmax, cmap = PRESETS[name]
+
+    return categorical_lut(vmin, vmax, cmap, CATEGORICAL_DISPLAY[name])
+
+
+def colorize(array, vmin, vmax, cmap, lut=None):
+    """Return the RGBA image of an array, masked pixels are transparent.
+
+    Args:
+        array (np.ndarray, np.ma.MaskedArray): array to colour
+        vmin (float): value mapped to the lower end of the colormap
+        vmax (float): value mapped to the upper end of the colormap
+        cmap (str): matplotlib colormap name
+        lut (np.ndarray): 256 x 4 lookup table of a byte array, replaces the colormap
+    """
+    data = np.ma.getdata(array)
+
+    if lut is None:
+        import matplotlib.pyplot as plt
+
+        rgba = plt.get_cmap(cmap)(
+            np.clip((data - vmin) / (vmax - vmin), 0, 1), bytes=True
+        )
+    else:
+        # A single gather, reading int8 classes as uint8 without a copy
+        if data.dtype.itemsize != 1:
+            data = data.astype(np.uint8)
+        rgba = lut[data.view(np.uint8)]
+
+    mask = np.ma.getmask(array)
+    if mask is not np.ma.nomask:
+        rgba[mask, 3] = 0
+
+    return rgba
+
+
+def tile_bounds(geo_t, shape):
+    """Return the ((south, west), (north, east)) bounds of an array.
+
+    Args:
+        geo_t (tuple): gdal geotransform of the array, in degrees
+        shape (tuple): shape of the array
+    """
+    west, north = geo_t[0], geo_t[3]
+    east = west + shape[1] * geo_t[1]
+    south = north + shape[0] * geo_t[5]
+
+    return (south, west), (north, east)
+
+
+def render(pyramid, bounds, zoom, vmin, vmax, cmap, lut=None):
+    """Render the part of an output seen in a map viewport as a PNG.
+
+    The pixels are read from the pyramid level closest to the screen
+    resolution at this zoom level, and only within the viewport.
+
+    Args:
+        pyramid (Pyramid): pyramid of the output, masked pixels are transparent
+        bounds (tuple): ((south, west), (north, east)) bounds of the viewport
+        zoom (int): zoom level of the map
+        vmin (float): value mapped to the lower end of the colormap
+        vmax (float): value mapped to the upper end of the colormap
+        cmap (str): matplotlib colormap name
+        lut (np.ndarray): lookup table of a categorical output, see get_lut
+
+    Returns:
+        (tuple): PNG data url and ((south, west), (north, east)) bounds of the
+            image, None if the output is out of the viewport
+    """
+    (south, west), (north, east) = bounds
+
+    # Keep about one output pixel per screen pixel
+    screen_pixel = 360 / (TILE_SIZE * 2**zoom)
+    step = max(1, math.floor(screen_pixel / pyramid.geo_t[1]))
+    array, geo_t, factor = pyramid.for_step(step)
+    step //= factor
+
+    # Pixels of the level within the viewport
+    y_size, x_size = array.shape
+    left = max(0, math.floor((west - geo_t[0]) / geo_t[1]))
+    right = min(x_size, math.ceil((east - geo_t[0]) / geo_t[1]))
+    top = max(0, math.floor((north - geo_t[3]) / geo_t[5]))
+    bottom = min(y_size, math.ceil((south - geo_t[3]) / geo_t[5]))
+
+    if left >= right or top >= bottom:
+        return None
+
+    window = array[top:bottom:step, left:right:step]
+    rgba = colorize(window, vmin, vmax, cmap, lut)
+
+    import matplotlib.pyplot as plt
+
+    buffer = io.BytesIO()
+    plt.imsave(buffer, rgba, format="png")
+    url = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+    # Snap the image to the edges of the pixels it covers
+    image_geo_t = list(geo_t)
+    image_geo_t[0] += left * geo_t[1]
+    image_geo_t[3] += top * geo_t[5]
+    image_geo_t[1] *= step
+    image_geo_t[5] *= step
+
+    return url, tile_bounds(image_geo_t, window.shape)
+
+
+def plot_sweep(rows, labels):
+    """Plot the areas of a threshold sweep as a PNG.
+
+    The forest area of each year is plotted against the forest threshold,
+    and each change class has a line per change magnitude threshold.
+
+    Args:
+        rows (list): rows returned by sweep.sweep
+        labels (dict): axis and legend label of each column of the rows, and
+            of the area axis
+
+    Returns:
+        (str): PNG data url of the plot
+    """
+    from matplotlib.figure import Figure
+
+    from .sweep import CHANGE_CLASSES
+
+    # Forest areas are repeated on each magnitude threshold of a forest threshold
+    forest = {row["forest_threshold"]: row for row in rows}
+    thresholds = list(forest)
+    change = "change_magnitude_threshold" in rows[0]
+
+    figure = Figure(figsize=(12 if change else 6, 4))
+    axes = figure.subplots(1, 2 if change else 1, squeeze=False)[0]
+
+    for name in ["forest_1", "forest_2"]:
+        if name in rows[0]:
+            areas = [forest[t][name] for t in thresholds]
+            axes[0].plot(thresholds, areas, marker="o", label=labels[name])
+    axes[0].set_xlabel(labels["forest_threshold"])
+    axes[0].set_ylabel(labels["area"])
+    axes[0].legend()
+
+    if change:
+        magnitudes = sorted({row["change_magnitude_threshold"] for row in rows})
+        for name, color in zip(CHANGE_CLASSES, ["C3", "C1", "C2", "C0"]):
+            for i, magnitude in enumerate(magnitudes):
+                areas = [
+                    row[name]
+                    for row in rows
+                    if row["change_magnitude_threshold"] == magnitude
+                ]
+                # Lighter lines for the higher magnitude thresholds
+                axes[1].plot(
+                    thresholds,
+                    areas,
+                    color=color,
+                    alpha=1 - 0.7 * i / max(1, len(magnitudes) - 1),
+                    label=labels[name] if i == 0 else None,
+                )
+        title = labels["change_magnitude_threshold"]
+        axes[1].set_xlabel(labels["forest_threshold"])
+        axes[1].set_ylabel(labels["area"])
+        axes[1].legend(title=f"{title}: {magnitudes[0]:g} - {magnitudes[-1]:g}")
+
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
@@ -0,0 +1,599 @@
+import json
+import re
+import shutil
+import tarfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Status of a download, sent to the DownloadScheduler callback
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+# The tile is in the catalogue, it's not downloaded again
+AVAILABLE = "available"
+
+# Archive members read by biota.LoadTile, any other raster is not extracted
+MEMBERS = ["_sl_HH", "_sl_HV", "_date", "_mask"]
+
+# JAXA name of a 1x1 tile at the start of its file names, e.g. N00W075
+TILE_NAME = re.compile(r"^[NS]\d{2}[EW]\d{3}")
+
+# Extensions of the archives served by JAXA
+ARCHIVE_SUFFIXES = [".tar.gz", ".zip"]
+
+# Lock of each catalogue file, shared by all the TileCatalogue of the process
+_catalogue_locks = {}
+_catalogue_locks_lock = threading.Lock()
+
+
+def tile_name(lat, lon):
+    """Return the JAXA name of a tile, e.g. N00W075."""
+    hem_ns = "S" if lat < 0 else "N"
+    hem_ew = "W" if lon < 0 else "E"
+
+    return f"{hem_ns}{abs(lat):02d}{hem_ew}{abs(lon):03d}"
+
+
+def parse_tile_name(name):
+    """Return the (lat, lon) corner of a tile from its JAXA name, e.g. N00W075."""
+    lat = int(name[1:3]) * (-1 if name[0] == "S" else 1)
+    lon = int(name[4:7]) * (-1 if name[3] == "W" else 1)
+
+    return lat, lon
+
+
+def sub_tiles(lat, lon, width=5):
+    """Return the upper-left corners of the 1x1 tiles within a larger tile.
+
+    Args:
+        lat (int): latitude of the large tile upper-left corner
+        lon (int): longitude of the large tile upper-left corner
+        width (int): size of the large tile in degrees
+
+    Returns:
+        (list): (lat, lon) tuples ordered from north-west to south-east
+    """
+    return [(lat - i, lon + j) for i in range(width) for j in range(width)]
+
+
+def find_archive(lat, lon, year, data_dir):
+    """Return the path of the downloaded archive of a tile, None if there is none.
+
+    Args:
+        lat (int): latitude of the tile upper-left corner
+        lon (int): longitude of the tile upper-left corner
+        year (int): year of the mosaic
+        data_dir (str, Path): directory where the archives are stored
+    """
+    pattern = f"{tile_name(lat, lon)}_{str(year)[-2:]}_*"
+
+    for path in Path(data_dir).glob(pattern):
+        if archive_stem(path) is not None:
+            return path
+
+    return None
+
+
+def archive_stem(path):
+    """Return the name of an archive without its extension, None if it's not an archive."""
+    for suffix in ARCHIVE_SUFFIXES:
+        if path.name.endswith(suffix):
+            return path.name[: -len(suffix)]
+
+    return None
+
+
+def download_tile(lat, lon, year, data_dir, large_tile=False):
+    """Download the ALOS mosaic archive of a tile from the JAXA server.
+
+    Args:
+        lat (int): latitude of the tile upper-left corner
+        lon (int): longitude of the tile upper-left corner
+        year (int): year of the mosaic
+        data_dir (str, Path): directory where the archive is stored
+        large_tile (bool): download the 5x5 degrees tile instead of the 1x1
+
+    Returns:
+        (Path): path of the archive, None if it was already removed
+    """
+    # biota loads the whole scientific stack, only import it to download
+    from biota import download as dw
+
+    try:
+        dw.download(
+            lat,
+            lon,
+            year,
+            large_tile=large_tile,
+            output_dir=data_dir,
+            verbose=True,
+        )
+    except ValueError as e:
+        # To those files that were downloaded but un-decompressed
+        if "already exists" not in next(iter(e.args)):
+            raise e
+
+    return find_archive(lat, lon, year, data_dir)
+
+
+class TileCatalogue:
+
+    filename = ".catalogue.json"
+
+    def __init__(self, data_dir):
+        """Catalogue of the ALOS mosaics downloaded and extracted in data_dir.
+
+        Every tile is recorded by (lat, lon, year, large_tile) with the names
+        of its archive and of its extracted directory, so checking a tile is
+        a dictionary lookup instead of listing data_dir. It's stored in
+        data_dir and kept up to date by the downloads and extractions.
+
+        A 5x5 tile is extracted as the 1x1 tiles it contains, its entry
+        lists them instead of a directory.
+
+        Args:
+            data_dir (str, Path): directory where the archives are stored
+
+        Example:
+            catalogue = TileCatalogue(data_dir)
+            directory = catalogue.directory(0, -75, 2016)
+        """
+        self.data_dir = Path(data_dir)
+        self.path = self.data_dir / self.filename
+        self.entries = self._read()
+
+        # Other catalogues of the same file may write it from other threads
+        with _catalogue_locks_lock:
+            self._lock = _catalogue_locks.setdefault(
+                str(self.path.resolve()), threading.Lock()
+            )
+
+    def _read(self):
+        """Return the entries stored in the catalogue file."""
+        return json.loads(self.path.read_text()) if self.path.exists() else {}
+
+    @staticmethod
+    def key(lat, lon, year, large_tile=False):
+        """Return the catalogue key of a tile, e.g. N00W075_2016 or N00W075_2016_5x5."""
+        return f"{tile_name(lat, lon)}_{year}{'_5x5' if large_tile else ''}"
+
+    def _path(self, lat, lon, year, large_tile, field):
+        """Return the recorded path of a tile, None if it's not there anymore."""
+        name = self.entries.get(self.key(lat, lon, year, large_tile), {}).get(field)
+        if name is None:
+            return None
+
+        path = self.data_dir / name
+
+        return path if path.exists() else None
+
+    def archive(self, lat, lon, year, large_tile=False):
+        """Return the downloaded archive of a tile, None if it's not available."""
+        return self._path(lat, lon, year, large_tile, "archive")
+
+    def directory(self, lat, lon, year):
+        """Return the extracted directory of a 1x1 tile, None if it's not available."""
+        return self._path(lat, lon, year, False, "directory")
+
+    def tiles(self, lat, lon, year, large_tile=False):
+        """Return the (lat, lon) corners of the 1x1 tiles extracted from a tile.
+
+        Returns:
+            (list): the tile itself for a 1x1 tile, the tiles it contains for a
+                5x5 tile, None if the tile was never extracted
+        """
+        if not large_tile:
+            return [(lat, lon)] if self.directory(lat, lon, year) else None
+
+        entry = self.entries.get(self.key(lat, lon, year, large_tile), {})
+        if "tiles" not in entry:
+            return None
+
+        return [tuple(tile) for tile in entry["tiles"]]
+
+    def directories(self, lat, lon, year, large_tile=False):
+        """Return the extracted directories of a tile, None if one is missing."""
+        tiles = self.tiles(lat, lon, year, large_tile)
+        if tiles is None:
+            return None
+
+        directories = [self.directory(*tile, year) for tile in tiles]
+
+        return directories if all(directories) else None
+
+    def add(self, lat, lon, year, large_tile=False, **fields):
+        """Record the archive, the directory or the 1x1 tiles of a tile.
+
+        The file is read again before writing it, so the entries added by the
+        other catalogues of data_dir, in this process or another one, are
+        kept.
+
+        Args:
+            lat (int): latitude of the tile upper-left corner
+            lon (int): longitude of the tile upper-left corner
+            year (int): year of the mosaic
+            large_tile (bool): whether it's a 5x5 tile
+            fields: archive or directory path, only their names are kept, or
+                tiles, list of the (lat, lon) 1x1 tiles of a 5x5 tile
+        """
+        fields = {
+            field: Path(value).name if isinstance(value, (str, Path)) else value
+            for field, value in fields.items()
+        }
+
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        lock_path = self.path.with_name(f"{self.path.name}.lock")
+
+        with self._lock, open(lock_path, "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            self.entries = self._read()
+            entry = self.entries.setdefault(
+                self.key(lat, lon, year, large_tile),
+                {"lat": lat, "lon": lon, "year": year, "large_tile": large_tile},
+            )
+            entry.update(fields)
+
+            tmp_path = self.path.with_name(f"{self.path.name}.part")
+            tmp_path.write_text(json.dumps(self.entries, indent=2))
+            tmp_path.replace(self.path)
+
+    def available(self, large_tile=False):
+        """Return the years extracted for each tile.
+
+        Returns:
+            (dict): sorted list of years keyed by (lat, lon) tile corner
+        """
+        years = {}
+        for entry in list(self.entries.values()):
+            tile = (entry["lat"], entry["lon"], entry["year"], entry["large_tile"])
+            if entry["large_tile"] == large_tile and self.directories(*tile):
+                years.setdefault(tile[:2], []).append(entry["year"])
+
+        return {tile: sorted(tile_years) for tile, tile_years in years.items()}
+
+
+def extract_archive(archive, members=MEMBERS):
+    """Extract the rasters read by biota from an ALOS mosaic archive.
+
+    The archive is extracted in a directory named after it, e.g.
+    N00W075_16_MOS_F02DAR.tar.gz is extracted in N00W075_16_MOS_F02DAR.
+
+    Args:
+        archive (Path): path of the .tar.gz or .zip archive
+        members (list): patterns of the members to extract, see MEMBERS
+
+    Returns:
+        (Path): directory where the archive was extracted
+    """
+    archive = Path(archive)
+    stem = archive_stem(archive)
+    if stem is None:
+        raise ValueError(f"{archive.name} is not a .tar.gz or .zip archive.")
+
+    directory = archive.parent / stem
+
+    def wanted(name):
+        """Select the members read by biota, and refuse the unsafe paths."""
+        path = Path(name)
+        safe = not path.is_absolute() and ".." not in path.parts
+
+        return safe and any(m in path.name for m in members)
+
+    # Extract in a temporary directory, so a failure won't leave half a tile
+    tmp_directory = directory.with_name(f"{directory.name}.part")
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+
+    if archive.name.endswith(".zip"):
+        with zipfile.ZipFile(archive) as f:
+            names = [n for n in f.namelist() if wanted(n)]
+            f.extractall(tmp_directory, members=names)
+    else:
+        with tarfile.open(archive, "r:gz") as f:
+            selected = [m for m in f.getmembers() if m.isfile() and wanted(m.name)]
+            # Use the safe extraction filter where python supports it
+            kwargs = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+            f.extractall(tmp_directory, members=selected, **kwargs)
+            names = [m.name for m in selected]
+
+    if not names:
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        raise ValueError(f"No ALOS raster found in {archive.name}.")
+
+    # Members extracted from a previous session are replaced
+    if directory.exists():
+        shutil.rmtree(directory)
+    tmp_directory.rename(directory)
+
+    return directory
+
+
+def split_tiles(directory):
+    """Move the rasters extracted from a 5x5 archive to a directory per 1x1 tile.
+
+    The directories are named as the 1x1 archives, e.g. the rasters of
+    N04W076 from N05W080_16_MOS_F02DAR go to N04W076_16_MOS_F02DAR, so
+    biota.LoadTile finds them as any other tile.
+
+    Args:
+        directory (Path): directory where the 5x5 archive was extracted, removed
+
+    Returns:
+        (dict): directory of each 1x1 tile, keyed by (lat, lon)
+    """
+    directory = Path(directory)
+    suffix = directory.name[len("N00W000") :]
+
+    # The north-west 1x1 tile has the same name as the 5x5 one
+    source = directory.rename(directory.with_name(f"{directory.name}.split"))
+
+    # Group the files by 1x1 tile name, wherever they are in the archive
+    files = {}
+    for path in source.rglob("*"):
+        match = TILE_NAME.match(path.name)
+        if path.is_file() and match:
+            files.setdefault(match.group(0), []).append(path)
+
+    directories = {}
+    for name, paths in files.items():
+        tile_directory = directory.with_name(f"{name}{suffix}")
+        if tile_directory.exists():
+            shutil.rmtree(tile_directory)
+        tile_directory.mkdir()
+
+        for path in paths:
+            path.rename(tile_directory / path.name)
+
+        directories[parse_tile_name(name)] = tile_directory
+
+    shutil.rmtree(source)
+
+    return directories
+
+
+def download_and_extract(scheduler, requests, callback=None):
+    """Download archives and extract each one as soon as its download finishes.
+
+    Extraction runs on a worker thread, so it overlaps with the downloads
+    still running. Tiles already extracted in the scheduler catalogue are
+    neither downloaded nor extracted again. 5x5 archives are split in the
+    1x1 tiles they contain, see split_tiles.
+
+    Args:
+        scheduler (DownloadScheduler): scheduler used to download the archives
+        requests (list): (lat, lon, year) tuples
+        callback (callable): called with the archive path before extracting it
+
+    Returns:
+        (dict): list of the extracted directories or raised exception, keyed by request
+    """
+    catalogue = scheduler.catalogue
+    large_tile = scheduler.large_tile
+
+    def extract(request, archive):
+        """Extract a single archive, unless the tile is already extracted."""
+        directories = catalogue.directories(*request, large_tile)
+        if directories is not None or archive is None:
+            return directories
+
+        if callback:
+            callback(archive)
+
+        directory = extract_archive(archive)
+        if not large_tile:
+            catalogue.add(*request, directory=directory)
+            return [directory]
+
+        lat, lon, year = request
+        directories = split_tiles(directory)
+        for tile, tile_directory in directories.items():
+            catalogue.add(*tile, year, directory=tile_directory)
+
+        # Tiles over the sea are not in the archive
+        tiles = [tile for tile in sub_tiles(lat, lon) if tile in directories]
+        catalogue.add(lat, lon, year, large_tile, tiles=tiles)
+
+        return [directories[tile] for tile in tiles]
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        futures = {}
+
+        def on_done(request, archive):
+            """Queue the extraction of a downloaded archive."""
+            futures[request] = executor.submit(extract, request, archive)
+
+        results = scheduler.run(requests, on_done=on_done)
+
+        for request, future in futures.items():
+            try:
+                results[request] = future.result()
+            except Exception as e:
+                results[request] = e
+
+    return results
+
+
+def is_missing(error):
+    """Check if a download error means that the archive doesn't exist on the server.
+
+    Retrying those downloads is useless, e.g. tiles over the sea have no mosaic.
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 404
+
+    return isinstance(error, ValueError) and "not found" in str(error)
+
+
+class UrlFetch:
+    def __init__(self, url_template, chunk_size=2**20, timeout=60):
+        """Download archives from an HTTP server following a url template.
+
+        It can replace download_tile in the DownloadScheduler, e.g. to fetch
+        the archives from a mirror or from a local server in tests.
+
+        Args:
+            url_template (str): url with {tile}, {year} and {yy} (last two digits of the year) fields
+            chunk_size (int): size of the chunks read from the server
+            timeout (int): seconds before a stalled connection fails
+
+        Example:
+            fetch = UrlFetch("http://localhost:8000/{tile}_{yy}_MOS_F02DAR.tar.gz")
+            DownloadScheduler(data_dir, fetch=fetch).run([(0, -75, 2016)])
+        """
+        self.url_template = url_template
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    def __call__(self, lat, lon, year, data_dir, large_tile=False):
+        """Download the archive of a tile and return its path."""
+        url = self.url_template.format(
+            tile=tile_name(lat, lon), year=year, yy=str(year)[-2:]
+        )
+        path = Path(data_dir) / url.split("/")[-1]
+
+        if path.exists():
+            return path
+
+        # Download in a temporary file so an interrupted download is not kept
+        tmp_path = path.with_name(f"{path.name}.part")
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(response, f, self.chunk_size)
+        tmp_path.replace(path)
+
+        return path
+
+
+class DownloadScheduler:
+    def __init__(
+        self,
+        data_dir,
+        large_tile=False,
+        max_workers=4,
+        retries=3,
+        backoff=2,
+        fetch=download_tile,
+        callback=None,
+        catalogue=None,
+    ):
+        """Download many (lat, lon, year) archives concurrently.
+
+        Downloads run in a bounded pool of threads, a failed download is
+        retried with an exponential backoff unless the archive doesn't exist.
+        Tiles recorded in the catalogue are not downloaded again.
+
+        Args:
+            data_dir (str, Path): directory where the archives are stored
+            large_tile (bool): download the 5x5 degrees tiles instead of the 1x1
+            max_workers (int): maximum number of simultaneous downloads
+            retries (int): number of retries of a failed download
+            backoff (float): seconds before the first retry, doubled after each retry
+            fetch (callable): function downloading a single archive, with the download_tile signature
+            callback (callable): called with the (lat, lon, year) request, its status and
+                extra information (attempt, delay, error) each time the status changes
+            catalogue (TileCatalogue): catalogue of the available tiles, the one of
+                data_dir by default
+
+        Example:
+            scheduler = DownloadScheduler(data_dir, callback=print)
+            results = scheduler.run([(0, -75, 2016), (0, -75, 2017)])
+        """
+        self.data_dir = data_dir
+        self.large_tile = large_tile
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.fetch = fetch
+        self.callback = callback
+        self.catalogue = catalogue or TileCatalogue(data_dir)
+
+        # Callbacks update widgets, avoid calling them from two threads at once
+        self._lock = threading.Lock()
+
+    def _notify(self, request, status, **info):
+        """Send the status of a request to the callback."""
+        if self.callback is None:
+            return
+
+        with self._lock:
+            self.callback(request, status, **info)
+
+    def _download(self, request):
+        """Download a single archive, retrying on failure."""
+        lat, lon, year = request
+
+        # No network call for the tiles already there
+        available = [
+            self.catalogue.directories(lat, lon, year, self.large_tile),
+            self.catalogue.archive(lat, lon, year, self.large_tile),
+        ]
+        if any(available):
+            self._notify(request, AVAILABLE)
+            return available[1]
+
+        for attempt in range(self.retries + 1):
+            self._notify(request, DOWNLOADING, attempt=attempt)
+            try:
+                result = self.fetch(
+                    lat, lon, year, self.data_dir, large_tile=self.large_tile
+                )
+            except Exception as e:
+                if attempt == self.retries or is_missing(e):
+                    self._notify(request, FAILED, error=e)
+                    raise e
+
+                delay = self.backoff * 2**attempt
+                self._notify(request, RETRYING, error=e, delay=delay)
+                time.sleep(delay)
+            else:
+                if result is not None:
+                    self.catalogue.add(lat, lon, year, self.large_tile, archive=result)
+                self._notify(request, DONE)
+                return result
+
+    def run(self, requests, on_done=None):
+        """Download all the requests and wait for them.
+
+        Args:
+            requests (list): (lat, lon, year) tuples
+            on_done (callable): called with the request and the fetch result as
+                soon as a download succeeds, from the main thread
+
+        Returns:
+            (dict): fetch result or raised exception, keyed by request
+        """
+        requests = list(dict.fromkeys(requests))
+        Path(self.data_dir).mkdir(parents=True, exist_ok=True)
+
+        for request in requests:
+            self._notify(request, QUEUED)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._download, r): r for r in requests}
+
+            for future in as_completed(futures):
+                request = futures[future]
+                try:
+                    results[request] = future.result()
+                except Exception as e:
+                    results[request] = e
+                    continue
+
+                if on_done:
+                    on_done(request, results[request])
+
+        return results
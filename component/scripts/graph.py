@@ -0,0 +1,140 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Graph:
+    def __init__(self):
+        """Small dependency graph running each of its nodes once.
+
+        Every node is a function called with the results of the nodes it
+        depends on. Nodes whose inputs are ready run in parallel threads, and
+        the result of a node is dropped as soon as all the nodes using it are
+        done, unless it was requested.
+
+        Example:
+            graph = Graph()
+            graph.add("tile", load_tile)
+            graph.add("agb", lambda tile: tile.getAGB(), ["tile"])
+            results, errors = graph.run(["agb"])
+        """
+        self.nodes = {}
+
+    def add(self, name, func, inputs=()):
+        """Add a node to the graph.
+
+        Args:
+            name (str): name of the node
+            func (callable): function computing the node from its inputs results
+            inputs (list): names of the nodes used by func, in the order of its arguments
+        """
+        unknown = [node for node in inputs if node not in self.nodes]
+        if unknown:
+            raise ValueError(f"Unknown inputs of {name}: {', '.join(unknown)}")
+
+        self.nodes[name] = (func, list(inputs))
+
+    def required(self, targets):
+        """Return the nodes needed to compute the targets, in dependency order."""
+        order = []
+
+        def visit(name):
+            if name not in order:
+                for node in self.nodes[name][1]:
+                    visit(node)
+                order.append(name)
+
+        for target in targets:
+            visit(target)
+
+        return order
+
+    def run(
+        self,
+        targets,
+        max_workers=None,
+        on_start=None,
+        on_done=None,
+        on_error=None,
+        cancel=None,
+    ):
+        """Compute the targets and the nodes they depend on.
+
+        A failing node fails all the nodes depending on it, the others are
+        still computed.
+
+        Args:
+            targets (list): names of the nodes to compute
+            max_workers (int): maximum number of nodes computed at the same time
+            on_start (callable): called with the name of each target before computing it
+            on_done (callable): called with the name and result of each computed target
+            on_error (callable): called with the name and exception of each failed target
+            cancel (threading.Event): when set, no other node is started
+
+        Returns:
+            (tuple): results and exceptions of the targets, keyed by name
+        """
+        nodes = self.required(targets)
+
+        # Number of nodes still needing the result of each node
+        users = {name: 0 for name in nodes}
+        for name in nodes:
+            for node in self.nodes[name][1]:
+                users[node] += 1
+
+        results, errors, running = {}, {}, {}
+        pending = list(nodes)
+
+        def finish(name, result=None, error=None):
+            if error is None:
+                results[name] = result
+                if name in targets and on_done:
+                    on_done(name, result)
+            else:
+                errors[name] = error
+                if name in targets and on_error:
+                    on_error(name, error)
+
+            # Release the inputs nobody needs anymore
+            for node in self.nodes[name][1]:
+                users[node] -= 1
+                if users[node] == 0 and node not in targets:
+                    results.pop(node, None)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    if cancel is not None and cancel.is_set():
+                        pending.clear()
+                        break
+
+                    func, inputs = self.nodes[name]
+                    failed = [node for node in inputs if node in errors]
+
+                    if failed:
+                        pending.remove(name)
+                        finish(name, error=errors[failed[0]])
+
+                    elif all(node in results for node in inputs):
+                        pending.remove(name)
+                        if name in targets and on_start:
+                            on_start(name)
+
+                        args = [results[node] for node in inputs]
+                        running[executor.submit(func, *args)] = name
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        finish(name, error=e)
+                    else:
+                        finish(name, result=result)
+
+        return (
+            {name: results[name] for name in targets if name in results},
+            {name: errors[name] for name in targets if name in errors},
+        )
@@ -0,0 +1,90 @@
+"""Measure the time needed to import the application tiles, as Voila does at startup.
+
+The import runs in a fresh interpreter with python -X importtime, so nothing
+is already cached in sys.modules.
+
+Example:
+    python -m component.scripts.import_time --budget 3 --strict
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Modules only needed to download, process or display, they shouldn't be
+# imported when the application starts
+DEFERRED = ["biota", "osgeo", "geopandas", "matplotlib", "scipy", "skimage"]
+
+
+def import_times(statement="from component.tiles import *"):
+    """Import in a new interpreter and return the cumulative time of each module.
+
+    Args:
+        statement (str): python statement to time
+
+    Returns:
+        (list): (module name, nesting level, cumulative import time in seconds)
+            of each imported module, level 0 modules are imported by the statement
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Lines look like "import time: self [us] | cumulative | imported package",
+    # nested imports are indented by 2 spaces per level
+    times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:") :].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), level, int(cumulative) / 1e6))
+
+    return times
+
+
+def get_parser():
+    """Return the command line parser."""
+    parser = argparse.ArgumentParser(
+        description="Measure the time needed to import the application tiles."
+    )
+    parser.add_argument(
+        "--budget", type=float, default=5.0, help="Maximum import time in seconds."
+    )
+    parser.add_argument("--top", type=int, default=10, help="Number of modules shown.")
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Fail if the budget is exceeded or a deferred module is imported.",
+    )
+
+    return parser
+
+
+def main(argv=None):
+    """Print the import time report, return 1 if it fails a strict check."""
+    args = get_parser().parse_args(argv)
+
+    times = import_times()
+    total = sum(seconds for _, level, seconds in times if level == 0)
+
+    print(f"Total import time: {total:.2f} s (budget {args.budget:.2f} s)")
+    for name, _, seconds in sorted(times, key=lambda t: -t[2])[: args.top]:
+        print(f"  {seconds:8.3f} s  {name}")
+
+    packages = {name.split(".")[0] for name, _, _ in times}
+    imported = [name for name in DEFERRED if name in packages]
+    if imported:
+        print(f"Deferred modules imported at startup: {', '.join(imported)}")
+
+    failed = total > args.budget or bool(imported)
+
+    return int(args.strict and failed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import os
+
+import numpy as np
+
+# Set to 0 to filter the patches with the biota implementation
+PATCHES_ENV = "BIOTA_FAST_PATCHES"
+
+# Number of rows labelled at a time
+BLOCK_ROWS = 1024
+
+# biota.indices.getContiguousAreas, kept when it's replaced, see install
+_biota_contiguous_areas = None
+
+
+def get_structure(contiguity):
+    """Return the neighbourhood of a pixel for the given contiguity.
+
+    Args:
+        contiguity (str): 'rook' for 4-connectivity or 'queen' for 8-connectivity
+    """
+    from scipy import ndimage
+
+    if contiguity not in ["rook", "queen"]:
+        raise ValueError("Contiguity constraint must be 'rook' or 'queen'.")
+
+    return ndimage.generate_binary_structure(2, 2 if contiguity == "queen" else 1)
+
+
+def _edge_pairs(upper, lower, contiguity):
+    """Return the labels touching across the edge between two rows."""
+    pairs = [(upper, lower)]
+    if contiguity == "queen":
+        pairs += [(upper[:-1], lower[1:]), (upper[1:], lower[:-1])]
+
+    a = np.concatenate([a for a, _ in pairs])
+    b = np.concatenate([b for _, b in pairs])
+    touching = (a > 0) & (b > 0) & (a != b)
+
+    return a[touching], b[touching]
+
+
+def _union(n_labels, a, b):
+    """Merge the labels of each pair, all at once.
+
+    Every label points to the smallest label of its patch: the pairs are
+    linked to the smaller of their roots, then the paths are compressed,
+    until the pairs share a root.
+
+    Args:
+        n_labels (int): number of labels, including the background 0
+        a (np.ndarray): first label of each pair to merge
+        b (np.ndarray): second label of each pair to merge
+
+    Returns:
+        (np.ndarray): root of each label
+    """
+    parent = np.arange(n_labels)
+
+    while True:
+        root_a, root_b = parent[a], parent[b]
+        linked = root_a != root_b
+        if not linked.any():
+            return parent
+
+        low = np.minimum(root_a[linked], root_b[linked])
+        high = np.maximum(root_a[linked], root_b[linked])
+        np.minimum.at(parent, high, low)
+
+        # Point every label straight to its root
+        while True:
+            grand_parent = parent[parent]
+            if np.array_equal(grand_parent, parent):
+                break
+            parent = grand_parent
+
+
+def label(binary, contiguity="queen", block_rows=BLOCK_ROWS):
+    """Label the patches of a binary array, block by block.
+
+    Each block of rows is labelled on its own, then the labels of the
+    patches crossing the edges between blocks are merged with a union-find
+    over the pairs of labels touching across each edge. The patches are
+    numbered in the order of their first pixel, as scipy.ndimage.label does
+    over the whole array.
+
+    Args:
+        binary (np.ndarray): pixels to label
+        contiguity (str): 'rook' or 'queen', see get_structure
+        block_rows (int): number of rows of each block
+
+    Returns:
+        (tuple): patch number of each pixel, 0 for the background, and number
+            of pixels of each patch number
+    """
+    from scipy import ndimage
+
+    structure = get_structure(contiguity)
+
+    # Labels of each block start from 1, offset makes them unique over the array
+    labels = np.zeros(binary.shape, dtype=np.int32)
+    blocks, offset, edges = [], 0, ([], [])
+    for top in range(0, binary.shape[0], block_rows):
+        block = labels[top : top + block_rows]
+        n_labels = ndimage.label(binary[top : top + block_rows], structure, block)
+
+        if blocks:
+            upper, upper_offset, _ = blocks[-1]
+            pairs = _edge_pairs(
+                np.where(upper[-1] > 0, upper[-1] + upper_offset, 0),
+                np.where(block[0] > 0, block[0] + offset, 0),
+                contiguity,
+            )
+            for edge, side in zip(edges, pairs):
+                edge.append(side)
+
+        blocks.append((block, offset, n_labels))
+        offset += n_labels
+
+    a, b = [np.concatenate(edge or [np.zeros(0, dtype=int)]) for edge in edges]
+    root = _union(offset + 1, a, b)
+
+    # Roots are the smallest label of each patch, numbered in the same order
+    is_root = root == np.arange(offset + 1)
+    patch = (np.cumsum(is_root) - 1)[root].astype(np.int32)
+
+    counts = np.zeros(offset + 1, dtype=np.int64)
+    for block, offset, n_labels in blocks:
+        block_counts = np.bincount(block.ravel(), minlength=n_labels + 1)
+        counts[0] += block_counts[0]
+        counts[offset + 1 : offset + n_labels + 1] = block_counts[1:]
+
+        table = patch[offset : offset + n_labels + 1].copy()
+        table[0] = 0
+        block[...] = table[block]
+
+    sizes = np.bincount(patch, weights=counts).astype(np.int64)
+
+    return labels, sizes
+
+
+def contiguous_areas(data, value, min_pixels=1, contiguity="queen"):
+    """Get the pixels of the patches of a value holding at least min_pixels pixels.
+
+    Same inputs and outputs as biota.indices.getContiguousAreas: masked
+    pixels take the value of the nearest valid pixel, and the kept patches
+    are numbered from 1 in the order of their first pixel. The patches are
+    labelled by blocks and filtered with lookup tables instead of sorting
+    the labels of every pixel.
+
+    Args:
+        data (np.ndarray, np.ma.MaskedArray): array to label
+        value: value of the pixels of the patches, e.g. True for forest
+        min_pixels (int): minimum number of pixels of a patch
+        contiguity (str): 'rook' or 'queen', see get_structure
+
+    Returns:
+        (tuple): pixels of the kept patches and their patch number (0 elsewhere),
+            masked like data
+    """
+    masked = np.ma.isMaskedArray(data)
+
+    if masked:
+        mask = np.ma.getmaskarray(data)
+        if mask.any():
+            from scipy import ndimage
+
+            indices = ndimage.distance_transform_edt(
+                mask, return_distances=False, return_indices=True
+            )
+            data = data.data[tuple(indices)]
+        else:
+            data = data.data
+
+    labels, sizes = label(data == value, contiguity)
+
+    # Renumber the patches large enough, the others go to the background
+    kept = sizes >= min_pixels
+    kept[0] = False
+    number = np.where(kept, np.cumsum(kept), 0)
+
+    location_id = number[labels]
+    contiguous_area = location_id > 0
+
+    if masked:
+        contiguous_area = np.ma.array(contiguous_area, mask=mask)
+        location_id = np.ma.array(location_id, mask=mask)
+
+    return contiguous_area, location_id
+
+
+def biota_contiguous_areas():
+    """Return the biota implementation of getContiguousAreas, even once replaced."""
+    import biota.indices
+
+    return _biota_contiguous_areas or biota.indices.getContiguousAreas
+
+
+def install():
+    """Make biota filter its forest and change patches with contiguous_areas.
+
+    The woody cover and the change type of biota look up
+    biota.indices.getContiguousAreas when they run, so replacing it is
+    enough. Nothing is replaced when BIOTA_FAST_PATCHES is 0.
+    """
+    global _biota_contiguous_areas
+
+    if os.environ.get(PATCHES_ENV, "1") == "0":
+        return
+
+    import biota.indices
+
+    if biota.indices.getContiguousAreas is not contiguous_areas:
+        _biota_contiguous_areas = biota.indices.getContiguousAreas
+        biota.indices.getContiguousAreas = contiguous_areas
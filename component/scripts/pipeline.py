@@ -0,0 +1,759 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from .cache import ChangeTileManager, TileCache, file_checksum
+from .download import tile_name
+from .graph import Graph
+from .profiling import Profiler, array_bytes, profiled
+from .pyramid import Pyramid
+from .sweep import sweep
+
+logger = logging.getLogger(__name__)
+
+# Outputs computed from a single year, keyed by the Process attribute name
+YEAR_OUTPUTS = {
+    "gamma0": "Gamma0",
+    "biomass": "Biomass",
+    "forest_cov": "Forest cover",
+}
+
+# Outputs computed from the change between two years
+CHANGE_OUTPUTS = {
+    "biomass_ch": "Biomass change",
+    "forest_ch": "Change type",
+    "def_risk": "Deforestation risk",
+}
+
+OUTPUTS = {**YEAR_OUTPUTS, **CHANGE_OUTPUTS}
+
+# Outputs made of classes, their overviews keep the most frequent class
+CATEGORICAL_OUTPUTS = ["Forest cover", "Change type", "Deforestation risk"]
+
+# Outputs that only depend on each pixel, and on its neighbours through the
+# Lee filter, so they can be computed window by window
+BLOCK_OUTPUTS = ["Gamma0", "Biomass", "Forest cover", "Biomass change", "Change type"]
+
+# Default values of the optional parameters, same as the Optional widget
+OPTIONS = {
+    "lee_filter": True,
+    "downsample_factor": 1,
+    "window_size": 5,
+    "forest_threshold": 10.0,
+    "area_threshold": 0.0,
+    "change_area_threshold": 2,
+    "change_magnitude_threshold": 15,
+    "contiguity": "queen",
+    "polarisation": "HV",
+}
+
+# Options used by each intermediate array of a tile. Changing a loading option
+# reloads the tile, the thresholds only recompute the woody cover and the change
+# from the AGB kept in the tile.
+LOAD_OPTIONS = ["downsample_factor", "lee_filter", "window_size"]
+WOODY_OPTIONS = ["forest_threshold", "area_threshold", "contiguity"]
+CHANGE_OPTIONS = ["change_area_threshold", "change_magnitude_threshold", "contiguity"]
+
+
+def output_filename(name, lat, lon, years, large_tile=False, aoi=False):
+    """Return the file name of an output, named like the biota outputs.
+
+    Args:
+        name (str): name of the output
+        lat (int): latitude of the tile upper-left corner
+        lon (int): longitude of the tile upper-left corner
+        years (list): years of the tiles, only the first one is used by the
+            outputs of a single year
+        large_tile (bool): whether it's the mosaic of a 5x5 tile
+        aoi (bool): whether the output is clipped to an AOI
+    """
+    if name not in CHANGE_OUTPUTS.values():
+        years = years[:1]
+
+    filename = "_".join([name, *[str(year) for year in years], tile_name(lat, lon)])
+    filename += "_5x5" if large_tile else ""
+    filename += "_aoi" if aoi else ""
+
+    return f"{filename}.tif"
+
+
+class Pipeline:
+    def __init__(
+        self,
+        data_dir,
+        output_dir,
+        parameter_file,
+        tile_cache=None,
+        change_manager=None,
+        disk_cache=None,
+        load_workers=2,
+        profiler=None,
+        aoi=None,
+        **options,
+    ):
+        """Compute and write the biota outputs without any widget.
+
+        The pipeline holds the optional parameters of a run. Tiles, change
+        tiles and derived arrays are read from the given caches, so the same
+        caches can be shared between several pipelines.
+
+        Args:
+            data_dir (str, Path): directory with the decompressed ALOS mosaics
+            output_dir (str, Path): directory where the outputs are written
+            parameter_file (str, Path): biota calibration parameter file
+            tile_cache (TileCache): cache of loaded tiles
+            change_manager (ChangeTileManager): cache of the change tile
+            disk_cache (DiskCache): persistent cache of derived arrays
+            load_workers (int): maximum number of tiles loaded or filtered at the
+                same time
+            profiler (Profiler): records each stage, by default only when the
+                BIOTA_PROFILE environment variable is set
+            aoi (shapely.geometry): area of interest in EPSG:4326, only the
+                pixels within it are computed, see clip
+            options: optional parameters, see OPTIONS for names and defaults
+
+        Example:
+            pipeline = Pipeline(data_dir, output_dir, parameter_file, lee_filter=False)
+            pipeline.run(0, -75, [2016, 2017], ["Biomass", "Change type"])
+        """
+        unknown = set(options) - set(OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+
+        self.data_dir = data_dir
+        self.output_dir = output_dir
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        self.parameter_file = parameter_file
+        self.options = {**OPTIONS, **options}
+
+        self.tile_cache = TileCache() if tile_cache is None else tile_cache
+        self.change_manager = (
+            ChangeTileManager() if change_manager is None else change_manager
+        )
+        self.disk_cache = disk_cache
+
+        # Each load holds the HH, HV and mask rasters of a whole tile in memory,
+        # and the Lee filter several float arrays of the size of the tile
+        self.load_slots = threading.BoundedSemaphore(load_workers)
+
+        self.profiler = Profiler() if profiler is None else profiler
+        self.aoi = aoi
+
+        self.parameter_checksum = file_checksum(parameter_file)
+
+        self.validate()
+
+    def validate(self):
+        """Raise an error if any of the optional parameters is not valid."""
+        if self.options["downsample_factor"] < 1:
+            raise ValueError("Downsampling factor must be an integer greater than 1.")
+
+        if self.options["window_size"] % 2 != 1:
+            raise ValueError("Option window_size must be an odd integer.")
+
+        if self.options["contiguity"] not in ["rook", "queen"]:
+            raise ValueError("Contiguity constraint must be 'rook' or 'queen'.")
+
+    def load_tile(self, lat, lon, year):
+        """Load the tile of the given year.
+
+        Tiles can be loaded from several threads, at most load_workers at a
+        time: gdal reads release the GIL so the years overlap.
+
+        Args:
+            lat (int): latitude of the tile upper-left corner
+            lon (int): longitude of the tile upper-left corner
+            year (int): year of the mosaic
+        """
+        with self.load_slots, self.profiler.stage("load", year=year) as record:
+            # The thresholds are not part of the key, see set_thresholds
+            tile = self.tile_cache.get(
+                str(self.data_dir),
+                lat,
+                lon,
+                year,
+                parameter_file=self.parameter_file,
+                output_dir=str(self.output_dir),
+                **{name: self.options[name] for name in LOAD_OPTIONS},
+            )
+            record["bytes"] = array_bytes(tile)
+
+        return tile
+
+    def set_thresholds(self, tile):
+        """Apply the woody cover options to a tile, possibly loaded by another pipeline.
+
+        The woody cover of the tile is dropped if it was computed with other
+        options, its AGB is kept.
+
+        Args:
+            tile (biota.LoadTile): tile to update
+        """
+        options = {name: self.options[name] for name in WOODY_OPTIONS}
+
+        if any(getattr(tile, name, None) != value for name, value in options.items()):
+            for name, value in options.items():
+                setattr(tile, name, value)
+            vars(tile).pop("WoodyCover", None)
+
+    def clip(self, tile):
+        """Restrict a tile to the bounding box of the AOI, masking the pixels outside.
+
+        The window keeps the neighbours needed by the Lee filter around the
+        AOI, so the pixels within it get the same values as over the whole
+        tile. Every output computed from the clipped tile covers the window
+        only.
+
+        Args:
+            tile (biota.LoadTile): the whole tile
+
+        Returns:
+            (biota.LoadTile): the tile unchanged without AOI, a window of it otherwise
+        """
+        if self.aoi is None:
+            return tile
+
+        from .aoi import bounding_window, rasterize
+        from .blocks import block_tile
+
+        inside = rasterize(self.aoi, tile.geo_t, (tile.ySize, tile.xSize))
+
+        halo = self.options["window_size"] // 2 if self.options["lee_filter"] else 0
+        # Only depends on the AOI, so the windows of both years match
+        window = bounding_window(inside, margin=halo)
+        if window is None:
+            raise ValueError(
+                f"The AOI doesn't intersect the tile lat: {tile.lat}, lon: {tile.lon}."
+            )
+
+        top, bottom, left, right = window
+
+        return block_tile(
+            tile, top, bottom, left, right, inside[top:bottom, left:right]
+        )
+
+    def _cache_params(self, tile, **params):
+        """Return the inputs that identify a derived array of the given tile."""
+        aoi = {} if self.aoi is None else {"aoi": self.aoi.wkt}
+
+        return {
+            "lat": tile.lat,
+            "lon": tile.lon,
+            "year": tile.year,
+            "data_dir": str(Path(self.data_dir).resolve()),
+            "lee_filter": self.options["lee_filter"],
+            "window_size": self.options["window_size"],
+            "downsample_factor": self.options["downsample_factor"],
+            "parameter_file": self.parameter_checksum,
+            **aoi,
+            **params,
+        }
+
+    def _from_cache(self, name, tile, compute, **params):
+        """Read a derived array from the disk cache, or compute and store it.
+
+        Args:
+            name (str): name of the derived array
+            tile (biota.LoadTile): tile from which the array is derived
+            compute (callable): function returning the array when not cached
+            params: parameters used by compute on top of the tile ones
+        """
+        if self.disk_cache is None:
+            return compute()
+
+        params = self._cache_params(tile, **params)
+
+        array = self.disk_cache.load(name, params)
+        if array is None:
+            array = compute()
+            self.disk_cache.save(name, params, array)
+
+        return array
+
+    @profiled("gamma0")
+    def get_gamma0(self, tile):
+        """Get Gamma0 of the tile in decibels."""
+        polarisation = self.options["polarisation"]
+
+        return self._from_cache(
+            "Gamma0",
+            tile,
+            lambda: tile.getGamma0(polarisation=polarisation, units="decibels"),
+            polarisation=polarisation,
+        )
+
+    @profiled("agb")
+    def get_agb(self, tile):
+        """Get AGB of the tile and keep it in the tile for the derived outputs."""
+        if not hasattr(tile, "AGB"):
+            tile.AGB = self._from_cache("AGB", tile, tile.getAGB)
+
+        return tile.getAGB()
+
+    @profiled("woody_cover")
+    def get_woody_cover(self, tile):
+        """Get woody cover of the tile and keep it in the tile for the derived outputs.
+
+        Only the woody cover is recomputed when a threshold changed since the
+        last call, see set_thresholds.
+        """
+        self.set_thresholds(tile)
+
+        if not hasattr(tile, "WoodyCover"):
+            self.get_agb(tile)
+            tile.WoodyCover = self._from_cache(
+                "WoodyCover",
+                tile,
+                tile.getWoodyCover,
+                **{name: self.options[name] for name in WOODY_OPTIONS},
+            )
+
+        return tile.getWoodyCover()
+
+    @profiled("change")
+    def get_change_tile(self, tile_1, tile_2):
+        """Get the change tile between both years, it's only computed once."""
+        # Restore the intermediate arrays of both years from the disk cache
+        for tile in [tile_1, tile_2]:
+            self.get_woody_cover(tile)
+
+        return self.change_manager.get(
+            tile_1, tile_2, *[self.options[name] for name in CHANGE_OPTIONS]
+        )
+
+    @profiled("sweep")
+    def sweep_thresholds(
+        self, tile_1, forest_thresholds, tile_2=None, magnitude_thresholds=()
+    ):
+        """Compute the forest and change areas of many thresholds from the AGB.
+
+        The AGB of the tiles is computed once, or read from the caches, then
+        every combination of thresholds is evaluated in a single pass over
+        it, see sweep.sweep. The area thresholds are not applied.
+
+        Args:
+            tile_1 (biota.LoadTile): tile of the first year
+            forest_thresholds (list): forest thresholds (tC/ha)
+            tile_2 (biota.LoadTile): tile of the second year, for the change areas
+            magnitude_thresholds (list): change magnitude thresholds (tC/ha)
+
+        Returns:
+            (list): areas in ha of each combination of thresholds, see sweep.sweep
+        """
+        agb_2 = None if tile_2 is None else self.get_agb(tile_2)
+
+        return sweep(
+            self.get_agb(tile_1),
+            forest_thresholds,
+            agb_2,
+            magnitude_thresholds,
+            pixel_area=tile_1.xRes * tile_1.yRes * 0.0001,
+        )
+
+    def compute(self, name, tile_1, tile_2=None):
+        """Compute an output.
+
+        Args:
+            name (str): name of the output, one of OUTPUTS values
+            tile_1 (biota.LoadTile): tile of the first year
+            tile_2 (biota.LoadTile): tile of the second year, only used by change outputs
+        """
+        if name == "Gamma0":
+            return self.get_gamma0(tile_1)
+
+        elif name == "Biomass":
+            return self.get_agb(tile_1)
+
+        elif name == "Forest cover":
+            return self.get_woody_cover(tile_1)
+
+        elif name in CHANGE_OUTPUTS.values():
+            if tile_2 is None:
+                raise ValueError("To calculate change, both years has to be filled")
+
+            change_tile = self.get_change_tile(tile_1, tile_2)
+
+            if name == "Biomass change":
+                return change_tile.getAGBChange()
+
+            elif name == "Change type":
+                change_tile.getChangeType()
+                return change_tile.ChangeCode
+
+            elif name == "Deforestation risk":
+                return change_tile.getRiskMap()
+
+        raise ValueError(f"Unknown output: {name}")
+
+    def graph(self, lat, lon, years):
+        """Return the dependency graph of the outputs of a tile.
+
+        Nodes are the tiles of each year (tile_1, tile_2) clipped to the AOI,
+        their AGB (agb_1, agb_2), Gamma0 (gamma0_1, gamma0_2) and woody cover
+        (woody_1, woody_2), the change tile (change), its AGB change
+        (agb_change) and change type (change_type), and the outputs, named as
+        in OUTPUTS.
+
+        The lazy arrays of biota are not thread-safe: each one has its own
+        node, and the nodes reading the same one of a tile or change tile
+        run after it. The AGB and Gamma0 of a tile both filter it, they run
+        one at a time. Tiles are loaded, and their AGB and Gamma0 filtered,
+        within the load_workers slots.
+
+        Args:
+            lat (int): latitude of the tile upper-left corner
+            lon (int): longitude of the tile upper-left corner
+            years (list): one year, or two years for the change outputs
+        """
+        graph = Graph()
+
+        def filtered(compute, lock):
+            """Return a node running compute in a load slot, one filter at a time."""
+
+            def node(tile):
+                with self.load_slots, lock:
+                    return compute(tile)
+
+            return node
+
+        for i, year in enumerate(years, 1):
+            tile = f"tile_{i}"
+            lock = threading.Lock()
+            graph.add(tile, lambda year=year: self.clip(self.load_tile(lat, lon, year)))
+            graph.add(f"agb_{i}", filtered(self.get_agb, lock), [tile])
+            graph.add(f"gamma0_{i}", filtered(self.get_gamma0, lock), [tile])
+            graph.add(
+                f"woody_{i}",
+                lambda tile, agb: self.get_woody_cover(tile),
+                [tile, f"agb_{i}"],
+            )
+
+        graph.add("Gamma0", lambda gamma0: gamma0, ["gamma0_1"])
+        graph.add("Biomass", lambda agb: agb, ["agb_1"])
+        graph.add("Forest cover", lambda woody: woody, ["woody_1"])
+
+        def change_type(change, agb_change):
+            change.getChangeType()
+            return change.ChangeCode
+
+        if len(years) == 2:
+            graph.add(
+                "change",
+                lambda tile_1, tile_2, *woody: self.get_change_tile(tile_1, tile_2),
+                ["tile_1", "tile_2", "woody_1", "woody_2"],
+            )
+            graph.add("agb_change", lambda change: change.getAGBChange(), ["change"])
+            graph.add("change_type", change_type, ["change", "agb_change"])
+            graph.add("Biomass change", lambda agb_change: agb_change, ["agb_change"])
+            graph.add("Change type", lambda change_type: change_type, ["change_type"])
+            graph.add(
+                "Deforestation risk",
+                lambda change, change_type: change.getRiskMap(),
+                ["change", "change_type"],
+            )
+
+        return graph
+
+    def compute_all(
+        self, lat, lon, years, outputs, tiles=None, max_workers=4, **callbacks
+    ):
+        """Compute several outputs of a tile, each intermediate array only once.
+
+        Both years are loaded and processed in parallel, and the intermediate
+        arrays are released as soon as no remaining output needs them. A few
+        workers are enough, the chains of both years and the outputs of the
+        change are the only nodes ready at the same time.
+
+        Args:
+            lat (int): latitude of the tile upper-left corner
+            lon (int): longitude of the tile upper-left corner
+            years (list): one year, or two years for the change outputs
+            outputs (list): names of the outputs, see OUTPUTS values
+            tiles (list): tiles returned along with the outputs, tile_1 and
+                tile_2, by default the tiles of all the years
+            max_workers (int): maximum number of nodes computed at the same time
+            callbacks: on_start, on_done, on_error and cancel, see Graph.run
+
+        Returns:
+            (tuple): results and exceptions keyed by name
+        """
+        if set(outputs) & set(CHANGE_OUTPUTS.values()) and len(years) != 2:
+            raise ValueError("To calculate change, both years has to be filled")
+
+        if tiles is None:
+            tiles = [f"tile_{i}" for i in range(1, len(years) + 1)]
+
+        return self.graph(lat, lon, years).run(
+            list(tiles) + list(outputs), max_workers, **callbacks
+        )
+
+    def nodata(self, tile):
+        """Return the nodata value of the outputs of a tile by gdal data type."""
+        # gdal is only needed to write, keep the import of the module light
+        from .writer import NODATA, gdal
+
+        return {
+            **NODATA,
+            gdal.GDT_Byte: tile.nodata_byte,
+            gdal.GDT_Float32: tile.nodata,
+        }
+
+    @profiled("write")
+    def write(self, name, array, tile_1, tile_2=None):
+        """Write an output as a Cloud-Optimized GeoTIFF in the output directory.
+
+        The data type of the file is the smallest one able to hold the array.
+        The overviews of a pyramid are embedded as they are, gdal computes
+        them for a plain array.
+
+        Args:
+            name (str): name of the output
+            array (np.ndarray, Pyramid): output array or its pyramid
+            tile_1 (biota.LoadTile): tile of the first year, gives the georeference
+            tile_2 (biota.LoadTile): tile of the second year, for change outputs
+
+        Returns:
+            (Path): path of the output file
+        """
+        from .writer import gdal_dtype, write_cog
+
+        overviews = None
+        if isinstance(array, Pyramid):
+            factors = array.overview_factors()
+            overviews = [array.level(factor)[0] for factor in factors]
+            array = array.array
+
+        dtype = gdal_dtype(array)
+
+        return write_cog(
+            array,
+            self.output_path(name, tile_1, tile_2),
+            tile_1.geo_t,
+            tile_1.proj,
+            dtype=dtype,
+            nodata=self.nodata(tile_1)[dtype],
+            categorical=name in CATEGORICAL_OUTPUTS,
+            overviews=overviews,
+        )
+
+    def write_all(self, arrays, tile_1, tile_2=None, max_workers=None):
+        """Write several outputs at once, each one from its own thread.
+
+        gdal releases the GIL while encoding, so the outputs are compressed
+        in parallel. A manifest of the written files is added next to them.
+
+        Args:
+            arrays (dict): output arrays or their pyramids keyed by output name
+            tile_1 (biota.LoadTile): tile of the first year, gives the georeference
+            tile_2 (biota.LoadTile): tile of the second year, for change outputs
+            max_workers (int): maximum number of outputs written at the same time
+
+        Returns:
+            (Path): path of the manifest
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                name: executor.submit(self.write, name, array, tile_1, tile_2)
+                for name, array in arrays.items()
+            }
+            paths = {name: future.result() for name, future in futures.items()}
+
+        return self.write_manifest(paths, tile_1, tile_2)
+
+    def write_manifest(self, paths, tile_1, tile_2=None):
+        """Write a JSON manifest listing the output files and how they were made.
+
+        Args:
+            paths (dict): path of the output files keyed by output name
+            tile_1 (biota.LoadTile): tile of the first year
+            tile_2 (biota.LoadTile): tile of the second year, if any
+
+        Returns:
+            (Path): path of the manifest
+        """
+        tiles = [tile_1] if tile_2 is None else [tile_1, tile_2]
+
+        manifest = {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "tile": tile_name(tile_1.lat, tile_1.lon),
+            "years": [tile.year for tile in tiles],
+            "aoi": None if self.aoi is None else self.aoi.wkt,
+            "parameters": {
+                **self.options,
+                "parameter_file": Path(self.parameter_file).name,
+                "parameter_file_md5": self.parameter_checksum,
+            },
+            "files": [
+                {
+                    "output": name,
+                    "file": Path(path).name,
+                    "size": Path(path).stat().st_size,
+                    "md5": file_checksum(path),
+                }
+                for name, path in paths.items()
+            ],
+        }
+
+        years = "_".join(str(tile.year) for tile in tiles)
+        path = Path(self.output_dir) / (
+            f"manifest_{years}_{tile_name(tile_1.lat, tile_1.lon)}.json"
+        )
+        path.write_text(json.dumps(manifest, indent=4))
+
+        return path
+
+    def output_path(self, name, tile_1, tile_2=None):
+        """Return the path of an output file, named like the biota outputs.
+
+        Args:
+            name (str): name of the output
+            tile_1 (biota.LoadTile): tile of the first year
+            tile_2 (biota.LoadTile): tile of the second year, for change outputs
+        """
+        years = [tile_1.year] if tile_2 is None else [tile_1.year, tile_2.year]
+
+        return Path(self.output_dir) / output_filename(
+            name, tile_1.lat, tile_1.lon, years, aoi=self.aoi is not None
+        )
+
+    def can_stream(self, name):
+        """Check if an output can be computed window by window with the current options.
+
+        Patches of forest and change are filtered by area over the whole tile,
+        they can't be computed from a single window.
+        """
+        if name not in BLOCK_OUTPUTS:
+            return False
+
+        if name in ["Forest cover", "Change type"] and self.options["area_threshold"]:
+            return False
+
+        if name == "Change type" and self.options["change_area_threshold"]:
+            return False
+
+        return True
+
+    @profiled("stream")
+    def stream(self, name, tile_1, tile_2=None, block_rows=256):
+        """Compute an output window by window, writing each one to its GeoTIFF.
+
+        The peak memory only depends on block_rows, the output is never held
+        in memory as a whole. Derived arrays are not read or stored in the
+        disk cache.
+
+        Args:
+            name (str): name of the output, see BLOCK_OUTPUTS
+            tile_1 (biota.LoadTile): tile of the first year
+            tile_2 (biota.LoadTile): tile of the second year, only used by change outputs
+            block_rows (int): number of rows of each window
+
+        Returns:
+            (Path): path of the output file
+        """
+        if not self.can_stream(name):
+            raise ValueError(f"{name} can't be computed by blocks with these options.")
+
+        from .blocks import stream_to_geotiff
+        from .writer import to_cog
+
+        # Windows need their own tiles and change tile, don't share the caches
+        block_pipeline = Pipeline(
+            self.data_dir,
+            self.output_dir,
+            self.parameter_file,
+            profiler=Profiler(enabled=False),
+            **self.options,
+        )
+        tiles = [tile_1] if tile_2 is None else [tile_1, tile_2]
+
+        # The Lee filter needs the neighbours of the pixels at the window edges
+        halo = self.options["window_size"] // 2 if self.options["lee_filter"] else 0
+
+        # Windows are written in a plain GeoTIFF, then copied as a COG by blocks
+        path = self.output_path(name, tile_1, tile_2)
+        tmp_path = path.with_suffix(".part.tif")
+
+        try:
+            stream_to_geotiff(
+                tiles,
+                lambda *blocks: block_pipeline.compute(name, *blocks),
+                tmp_path,
+                self.nodata(tile_1),
+                block_rows=block_rows,
+                halo=halo,
+            )
+            to_cog(tmp_path, path, categorical=name in CATEGORICAL_OUTPUTS)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        return path
+
+    def run(self, lat, lon, years, outputs, block_rows=None):
+        """Compute and write the outputs of a tile.
+
+        Args:
+            lat (int): latitude of the tile upper-left corner
+            lon (int): longitude of the tile upper-left corner
+            years (list): one year, or two years if computing change outputs
+            outputs (list): names of the outputs, see OUTPUTS values
+            block_rows (int): compute the outputs by windows of block_rows rows when
+                possible, see stream. None to compute the whole tile at once.
+
+        Returns:
+            (Path): path of the manifest of the written outputs
+        """
+        streamed = [name for name in outputs if block_rows and self.can_stream(name)]
+        whole = [name for name in outputs if name not in streamed]
+
+        if block_rows:
+            for name in whole:
+                logger.warning(
+                    f"{name} can't be computed by blocks, using the whole tile"
+                )
+
+        paths, loaded = {}, {}
+
+        def write(name, result):
+            """Write each output as soon as it's computed."""
+            if name.startswith("tile_"):
+                loaded[name] = result
+                return
+
+            paths[name] = self.write(name, result, *[loaded[k] for k in sorted(loaded)])
+            logger.info(f"{name} written in {self.output_dir}")
+
+        # Only the tiles used by the whole outputs are taken from the graph,
+        # the streamed outputs read their own windows
+        change = set(whole) & set(CHANGE_OUTPUTS.values())
+        needed = ["tile_1", "tile_2"] if change else ["tile_1"]
+
+        # Intermediate arrays are computed once and shared by the outputs
+        if whole:
+            _, errors = self.compute_all(
+                lat,
+                lon,
+                years,
+                whole,
+                tiles=needed,
+                on_start=lambda name: logger.info(
+                    f"Computing {name} for lat: {lat}, lon: {lon}..."
+                ),
+                on_done=write,
+            )
+            if errors:
+                raise next(iter(errors.values()))
+
+        tiles = [
+            loaded.get(f"tile_{i}") or self.clip(self.load_tile(lat, lon, year))
+            for i, year in enumerate(years, 1)
+        ]
+
+        for name in streamed:
+            logger.info(f"Computing {name} for lat: {lat}, lon: {lon} by blocks...")
+            paths[name] = self.stream(name, *tiles, block_rows=block_rows)
+            logger.info(f"{name} written in {self.output_dir}")
+
+        return self.write_manifest(paths, *tiles)
@@ -0,0 +1,262 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Set to 1 to log the profile of every pipeline, or to the path of a JSON lines file
+PROFILE_ENV = "BIOTA_PROFILE"
+
+# Seconds between two samples of the resident memory while stages are running
+RSS_INTERVAL = 0.05
+
+
+def array_bytes(obj):
+    """Return the memory used by an array, or by all the arrays of an object.
+
+    Args:
+        obj: array, biota tile or any other object
+
+    Returns:
+        (int): size in bytes, None if the object holds no array
+    """
+    if isinstance(obj, np.ndarray):
+        mask = np.ma.getmask(obj)
+        return obj.nbytes + (mask.nbytes if mask is not np.ma.nomask else 0)
+
+    arrays = [
+        value
+        for value in getattr(obj, "__dict__", {}).values()
+        if isinstance(value, np.ndarray)
+    ]
+
+    return sum(array_bytes(array) for array in arrays) if arrays else None
+
+
+def current_rss():
+    """Return the current resident memory of the process in bytes.
+
+    Returns:
+        (int): size in bytes, None where /proc isn't available
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class _RssSampler:
+    def __init__(self, interval=RSS_INTERVAL):
+        """Sample the resident memory of the process while stages are running.
+
+        ru_maxrss is the peak of the whole life of the process, it never goes
+        down after a large stage. The current resident memory is sampled
+        instead, from a single thread shared by all the running stages.
+
+        Args:
+            interval (float): seconds between two samples
+        """
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.thread = None
+
+        # Highest sample of each running stage
+        self.peaks = {}
+
+    def start(self, key):
+        """Start tracking the peak memory of a stage."""
+        rss = current_rss()
+        if rss is None:
+            return
+
+        with self.lock:
+            self.peaks[key] = rss
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._sample, daemon=True)
+                self.thread.start()
+
+    def stop(self, key):
+        """Return the peak resident memory of a stage in bytes, None if unknown."""
+        rss = current_rss()
+
+        with self.lock:
+            peak = self.peaks.pop(key, None)
+
+        if peak is None or rss is None:
+            return peak
+
+        return max(peak, rss)
+
+    def _sample(self):
+        while True:
+            time.sleep(self.interval)
+            rss = current_rss()
+
+            with self.lock:
+                # The thread stops with the last stage, the next one restarts it
+                if not self.peaks or rss is None:
+                    self.thread = None
+                    return
+
+                for key, peak in self.peaks.items():
+                    self.peaks[key] = max(peak, rss)
+
+
+_sampler = _RssSampler()
+
+
+class Profiler:
+    def __init__(self, enabled=None, log_path=None):
+        """Record the wall time, CPU time, peak memory and output size of each stage.
+
+        Every record is also logged as a JSON line, and appended to log_path
+        if given. By default the profiler is switched on by the BIOTA_PROFILE
+        environment variable, so production runs can be profiled without any
+        change in the code.
+
+        CPU time and memory are measured for the whole process: stages
+        running at the same time in other threads are accounted in both. The
+        peak memory of a stage is the highest resident memory of the process
+        sampled while it runs, see _RssSampler.
+
+        Args:
+            enabled (bool): record the stages, defaults to BIOTA_PROFILE being set
+            log_path (str, Path): JSON lines file, defaults to BIOTA_PROFILE if
+                it's not 1
+
+        Example:
+            profiler = Profiler(enabled=True)
+            with profiler.stage("load", year=2016) as record:
+                tile = load_tile()
+                record["bytes"] = array_bytes(tile)
+        """
+        env = os.environ.get(PROFILE_ENV, "")
+
+        self.enabled = bool(env) if enabled is None else enabled
+        self.log_path = log_path or (env if env not in ["", "0", "1"] else None)
+
+        self.records = []
+        self.lock = threading.Lock()
+        self._depth = threading.local()
+
+    def stage(self, name, **info):
+        """Return a context manager recording a stage, see __init__ example.
+
+        Args:
+            name (str): name of the stage
+            info: extra fields of the record, e.g. the tile year
+        """
+        return _Stage(self, name, info)
+
+    def call(self, name, func, *args, **info):
+        """Call a function within a stage, recording the size of its result."""
+        with self.stage(name, **info) as record:
+            result = func(*args)
+            if self.enabled:
+                record["bytes"] = array_bytes(result)
+
+        return result
+
+    def add(self, record):
+        """Keep a record and log it as a JSON line."""
+        line = json.dumps(record, default=str)
+
+        with self.lock:
+            self.records.append(record)
+
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write(line + "\n")
+
+        logger.info(line)
+
+    def summary(self):
+        """Return the total wall time, CPU time and call count of each stage.
+
+        Stages called by other stages are only counted at their outer level.
+        """
+        summary = {}
+        for record in self.records:
+            if record["depth"]:
+                continue
+
+            stage = summary.setdefault(
+                record["stage"], {"calls": 0, "wall": 0, "cpu": 0, "peak_rss": 0}
+            )
+            stage["calls"] += 1
+            stage["wall"] += record["wall"]
+            stage["cpu"] += record["cpu"]
+            stage["peak_rss"] = max(stage["peak_rss"], record["peak_rss"] or 0)
+
+        return summary
+
+    def clear(self):
+        """Drop all the records."""
+        with self.lock:
+            self.records = []
+
+
+class _Stage:
+    def __init__(self, profiler, name, info):
+        """Context manager recording a single stage, see Profiler.stage."""
+        self.profiler = profiler
+        self.record = {"stage": name, **info}
+
+    def __enter__(self):
+        if not self.profiler.enabled:
+            return self.record
+
+        depth = getattr(self.profiler._depth, "value", 0)
+        self.profiler._depth.value = depth + 1
+
+        self.record["depth"] = depth
+        self.start = (time.perf_counter(), time.process_time())
+        _sampler.start(id(self))
+
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.profiler.enabled:
+            return
+
+        self.profiler._depth.value -= 1
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        self.record.update(
+            {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "wall": round(wall - self.start[0], 4),
+                "cpu": round(cpu - self.start[1], 4),
+                "peak_rss": _sampler.stop(id(self)),
+                "error": None if exc is None else repr(exc),
+            }
+        )
+        self.profiler.add(self.record)
+
+
+def profiled(name):
+    """Decorate a method to record its calls with the profiler of its object.
+
+    Args:
+        name (str): name of the stage
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            return self.profiler.call(
+                name, functools.partial(method, self, *args, **kwargs)
+            )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,132 @@
+import numpy as np
+
+
+def _blocks(array):
+    """Return the 2x2 blocks of an array as a (rows, cols, 4) view of its values and mask.
+
+    Odd edges are padded with masked pixels.
+    """
+    data = np.ma.getdata(array)
+    mask = np.ma.getmaskarray(array)
+
+    pad = ((0, data.shape[0] % 2), (0, data.shape[1] % 2))
+    data = np.pad(data, pad)
+    mask = np.pad(mask, pad, constant_values=True)
+
+    y, x = data.shape[0] // 2, data.shape[1] // 2
+
+    def split(a):
+        return a.reshape(y, 2, x, 2).transpose(0, 2, 1, 3).reshape(y, x, 4)
+
+    return split(data), split(mask)
+
+
+def reduce_mean(array):
+    """Halve the resolution of an array with the mean of the unmasked pixels."""
+    data, mask = _blocks(array)
+
+    valid = ~mask
+    count = valid.sum(axis=-1)
+    total = np.where(valid, data, 0).sum(axis=-1, dtype=np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (total / count).astype(np.result_type(data.dtype, np.float32))
+
+    return np.ma.array(mean, mask=count == 0)
+
+
+def reduce_mode(array):
+    """Halve the resolution of an array with the most frequent unmasked value.
+
+    Ties are won by the first pixel of the block in reading order.
+    """
+    data, mask = _blocks(array)
+
+    valid = ~mask
+
+    # Number of unmasked pixels of the block equal to each of its pixels
+    counts = np.stack(
+        [((data == data[..., [i]]) & valid).sum(axis=-1) for i in range(4)], axis=-1
+    )
+    counts[mask] = -1
+
+    mode = np.take_along_axis(data, counts.argmax(axis=-1)[..., None], axis=-1)
+
+    return np.ma.array(mode[..., 0], mask=~valid.any(axis=-1))
+
+
+class Pyramid:
+    def __init__(self, array, geo_t, categorical=False):
+        """Multi-resolution copies of an output, each half the size of the previous one.
+
+        Levels are only built when first requested, from the previous level,
+        so reading a coarse level of a big tile is cheap once built.
+
+        Args:
+            array (np.ndarray, np.ma.MaskedArray): full resolution output
+            geo_t (tuple): gdal geotransform of the array
+            categorical (bool): whether the values are classes, reduced with the
+                most frequent class instead of the mean
+
+        Example:
+            pyramid = Pyramid(tile.AGB, tile.geo_t)
+            array, geo_t = pyramid.level(8)
+        """
+        self.array = array
+        self.geo_t = tuple(geo_t)
+        self.categorical = categorical
+
+        self._levels = {1: array}
+
+    @property
+    def shape(self):
+        """Shape of the full resolution array."""
+        return self.array.shape
+
+    def level(self, factor):
+        """Return the array reduced by a power of 2 factor and its geotransform.
+
+        Args:
+            factor (int): reduction factor, 1, 2, 4, 8...
+        """
+        if factor < 1 or factor & (factor - 1):
+            raise ValueError("The reduction factor must be a power of 2.")
+
+        if factor not in self._levels:
+            reduce = reduce_mode if self.categorical else reduce_mean
+            self._levels[factor] = reduce(self.level(factor // 2)[0])
+
+        geo_t = list(self.geo_t)
+        geo_t[1] *= factor
+        geo_t[5] *= factor
+
+        return self._levels[factor], tuple(geo_t)
+
+    def for_step(self, step):
+        """Return the coarsest level not coarser than one pixel every step pixels.
+
+        Args:
+            step (int): number of full resolution pixels per displayed pixel
+
+        Returns:
+            (tuple): the level array, its geotransform and its factor
+        """
+        factor = 1
+        while factor * 2 <= step and max(self.shape) // (factor * 2):
+            factor *= 2
+
+        return (*self.level(factor), factor)
+
+    def overview_factors(self, min_size=512):
+        """Return the factors of the levels to embed as overviews in a GeoTIFF.
+
+        Args:
+            min_size (int): last level is the first one smaller than min_size
+        """
+        factors = []
+        factor = 2
+        while max(self.shape) / (factor // 2) > min_size:
+            factors.append(factor)
+            factor *= 2
+
+        return factors
@@ -0,0 +1,215 @@
+import numpy as np
+
+# Change classes of the sweep, as in biota.LoadChange.getChangeType
+CHANGE_CLASSES = ["deforestation", "degradation", "growth", "afforestation"]
+
+# Number of pixels counted at a time, bounds the memory of the indices
+CHUNK_SIZE = 2**22
+
+
+def _valid(*arrays):
+    """Return the values of the pixels valid in all the arrays, as float64."""
+    invalid = np.zeros(np.shape(arrays[0]), dtype=bool)
+    for array in arrays:
+        invalid |= np.ma.getmaskarray(array) | ~np.isfinite(np.ma.getdata(array))
+
+    return [np.ma.getdata(array)[~invalid].astype(np.float64) for array in arrays]
+
+
+def _count_rectangles(f_lo, f_hi, m_hi, shape):
+    """Count the pixels of every cell of a grid of thresholds in one pass.
+
+    Each pixel is counted in the cells [f_lo, f_hi) x [0, m_hi) of the grid.
+    The corners of the rectangles are summed into a difference array, its
+    cumulative sum over both axes gives the count of each cell.
+
+    Args:
+        f_lo (np.ndarray): first forest threshold of each pixel
+        f_hi (np.ndarray): last (excluded) forest threshold of each pixel
+        m_hi (np.ndarray): last (excluded) magnitude threshold of each pixel
+        shape (tuple): number of forest and magnitude thresholds
+
+    Returns:
+        (np.ndarray): number of pixels in each cell of the grid
+    """
+    n_f, n_m = shape
+    f_hi = np.maximum(f_lo, f_hi)
+    size = (n_f + 1) * (n_m + 1)
+
+    def corners(rows, cols):
+        return np.bincount(rows * (n_m + 1) + cols, minlength=size)
+
+    diff = (
+        corners(f_lo, 0) - corners(f_hi, 0) - corners(f_lo, m_hi) + corners(f_hi, m_hi)
+    )
+    counts = diff.reshape(n_f + 1, n_m + 1).cumsum(axis=0).cumsum(axis=1)
+
+    return counts[:n_f, :n_m]
+
+
+def forest_counts(agb, forest_thresholds):
+    """Count the forest pixels for every forest threshold in one pass.
+
+    A pixel is forest when its AGB reaches the threshold, as in biota. The
+    pixels are binned between the sorted thresholds, and the cumulative
+    histogram gives the number of pixels above each one.
+
+    Args:
+        agb (np.ndarray): AGB values of the valid pixels
+        forest_thresholds (np.ndarray): sorted forest thresholds (tC/ha)
+
+    Returns:
+        (np.ndarray): number of forest pixels for each threshold
+    """
+    # Number of thresholds each pixel reaches
+    bins = np.searchsorted(forest_thresholds, agb, side="right")
+    histogram = np.bincount(bins, minlength=len(forest_thresholds) + 1)
+
+    return histogram[::-1].cumsum()[::-1][1:]
+
+
+def change_counts(
+    agb_1, agb_2, forest_thresholds, magnitude_thresholds, intensity_threshold=0.2
+):
+    """Count the pixels of each change class for every pair of thresholds.
+
+    The classes follow biota: a change is flagged when the AGB change
+    reaches both the magnitude threshold and the intensity threshold, a
+    proportion of the AGB of the first year. For a pixel, the forest
+    thresholds of a class form an interval and the magnitude thresholds
+    reaching its change another one, so each pixel is counted once per class
+    whatever the number of thresholds.
+
+    Args:
+        agb_1 (np.ndarray): AGB of the first year, pixels valid in both years
+        agb_2 (np.ndarray): AGB of the second year, same pixels as agb_1
+        forest_thresholds (np.ndarray): sorted forest thresholds (tC/ha)
+        magnitude_thresholds (np.ndarray): sorted change magnitude thresholds (tC/ha)
+        intensity_threshold (float): minimum proportional change, biota's default
+
+    Returns:
+        (dict): number of pixels of each of CHANGE_CLASSES, arrays of shape
+            (forest thresholds, magnitude thresholds)
+    """
+    shape = (len(forest_thresholds), len(magnitude_thresholds))
+    counts = {name: np.zeros(shape, dtype=np.int64) for name in CHANGE_CLASSES}
+
+    for start in range(0, len(agb_1), CHUNK_SIZE):
+        a_1 = agb_1[start : start + CHUNK_SIZE]
+        a_2 = agb_2[start : start + CHUNK_SIZE]
+        change = a_2 - a_1
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            intensity = change / a_1
+        intense = (intensity >= intensity_threshold) | (
+            intensity < -intensity_threshold
+        )
+        decrease = a_2 < a_1
+
+        a_1, a_2, change, decrease = [
+            array[intense] for array in [a_1, a_2, change, decrease]
+        ]
+
+        # biota flags a gain from the threshold, a loss beyond it
+        m_hi = np.where(
+            decrease,
+            np.searchsorted(magnitude_thresholds, -change, side="left"),
+            np.searchsorted(magnitude_thresholds, change, side="right"),
+        )
+
+        # Forest threshold index of each AGB: thresholds below it are reached
+        f_1 = np.searchsorted(forest_thresholds, a_1, side="right")
+        f_2 = np.searchsorted(forest_thresholds, a_2, side="right")
+        zero = np.zeros_like(f_1)
+
+        # Forest then non forest, the threshold lies between both AGB
+        counts["deforestation"] += _count_rectangles(f_2, f_1, m_hi, shape)
+        # Forest both years, with a loss or a gain
+        counts["degradation"] += _count_rectangles(
+            zero, np.where(decrease, f_2, 0), m_hi, shape
+        )
+        counts["growth"] += _count_rectangles(
+            zero, np.where(decrease, 0, f_1), m_hi, shape
+        )
+        # Non forest then forest
+        counts["afforestation"] += _count_rectangles(f_1, f_2, m_hi, shape)
+
+    return counts
+
+
+def sweep(
+    agb_1,
+    forest_thresholds,
+    agb_2=None,
+    magnitude_thresholds=(),
+    pixel_area=1.0,
+    intensity_threshold=0.2,
+):
+    """Compute the forest and change areas of every combination of thresholds.
+
+    The AGB arrays are read once, the cost hardly depends on the number of
+    thresholds. The areas are computed before the area thresholds, which
+    depend on the shape of the patches and not only on each pixel.
+
+    Args:
+        agb_1 (np.ma.MaskedArray): AGB of the first year (tC/ha)
+        forest_thresholds (list): forest thresholds (tC/ha)
+        agb_2 (np.ma.MaskedArray): AGB of the second year, for the change areas
+        magnitude_thresholds (list): change magnitude thresholds (tC/ha)
+        pixel_area (float): area of a pixel (ha)
+        intensity_threshold (float): minimum proportional change, see change_counts
+
+    Returns:
+        (list): a row per combination of thresholds, with the forest area of
+            each year and the area of each of CHANGE_CLASSES in ha
+
+    Example:
+        rows = sweep(agb_1, [5, 10, 15], agb_2, [5, 15, 25], pixel_area=0.0625)
+    """
+    forest_thresholds = np.unique(np.asarray(forest_thresholds, dtype=np.float64))
+    magnitude_thresholds = np.unique(np.asarray(magnitude_thresholds, dtype=np.float64))
+    if not forest_thresholds.size:
+        raise ValueError("At least one forest threshold is needed.")
+
+    areas = {"forest_1": forest_counts(*_valid(agb_1), forest_thresholds)}
+
+    if agb_2 is not None:
+        areas["forest_2"] = forest_counts(*_valid(agb_2), forest_thresholds)
+
+    if agb_2 is not None and magnitude_thresholds.size:
+        counts = change_counts(
+            *_valid(agb_1, agb_2),
+            forest_thresholds,
+            magnitude_thresholds,
+            intensity_threshold,
+        )
+        areas.update(counts)
+
+    rows = []
+    for i, forest_threshold in enumerate(forest_thresholds):
+        row = {
+            "forest_threshold": float(forest_threshold),
+            **{
+                name: float(area[i] * pixel_area)
+                for name, area in areas.items()
+                if area.ndim == 1
+            },
+        }
+
+        if "deforestation" not in areas:
+            rows.append(row)
+            continue
+
+        for j, magnitude_threshold in enumerate(magnitude_thresholds):
+            rows.append(
+                {
+                    **row,
+                    "change_magnitude_threshold": float(magnitude_threshold),
+                    **{
+                        name: float(areas[name][i, j] * pixel_area)
+                        for name in CHANGE_CLASSES
+                    },
+                }
+            )
+
+    return rows
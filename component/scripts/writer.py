@@ -0,0 +1,210 @@
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from osgeo import gdal
+except ImportError:
+    import gdal
+
+# Default nodata value by gdal data type
+NODATA = {
+    gdal.GDT_Byte: 255,
+    gdal.GDT_UInt16: 65535,
+    gdal.GDT_Int16: -9999,
+    gdal.GDT_UInt32: 4294967295,
+    gdal.GDT_Int32: -9999,
+    gdal.GDT_Float32: -9999.0,
+}
+
+# gdal data type of each numpy integer type, 64-bit integers are narrowed if
+# their values fit, see gdal_dtype
+INTEGER_DTYPES = {
+    np.dtype(np.int8): gdal.GDT_Byte,
+    np.dtype(np.uint8): gdal.GDT_Byte,
+    np.dtype(np.int16): gdal.GDT_Int16,
+    np.dtype(np.uint16): gdal.GDT_UInt16,
+    np.dtype(np.int32): gdal.GDT_Int32,
+    np.dtype(np.uint32): gdal.GDT_UInt32,
+}
+
+
+def gdal_dtype(array):
+    """Return the smallest gdal data type able to store the array values.
+
+    Args:
+        array (np.ndarray): array to write
+
+    Raises:
+        ValueError: if 64-bit integer values don't fit in 32 bits
+    """
+    dtype = np.ma.getdata(array).dtype
+
+    if dtype == bool:
+        return gdal.GDT_Byte
+    elif dtype in INTEGER_DTYPES:
+        return INTEGER_DTYPES[dtype]
+    elif np.issubdtype(dtype, np.integer):
+        values = np.ma.compressed(array) if np.ma.isMaskedArray(array) else array
+        low, high = (values.min(), values.max()) if values.size else (0, 0)
+
+        for candidate in [np.int32, np.uint32]:
+            info = np.iinfo(candidate)
+            if info.min <= low and high <= info.max:
+                return INTEGER_DTYPES[np.dtype(candidate)]
+
+        raise ValueError(f"Values from {low} to {high} don't fit in a 32-bit band.")
+
+    return gdal.GDT_Float32
+
+
+def to_raster_array(array, dtype, nodata):
+    """Return a plain array ready to be written in a band of the given data type.
+
+    Args:
+        array (np.ndarray, np.ma.MaskedArray): array to write, masked pixels are set to nodata
+        dtype (int): gdal data type of the band
+        nodata (float): nodata value of the band
+    """
+    # gdal would clip the negative values (e.g. a -1 int8 nodata) to 0
+    if dtype == gdal.GDT_Byte:
+        array = array.astype(np.uint8)
+
+    return np.ma.filled(array, nodata) if np.ma.isMaskedArray(array) else array
+
+
+def cog_options(categorical=False, compress="DEFLATE", blocksize=512, overviews="AUTO"):
+    """Return the creation options of a Cloud-Optimized GeoTIFF.
+
+    Args:
+        categorical (bool): whether the values are classes, overviews then keep the most frequent class
+        compress (str): 'DEFLATE' or 'ZSTD'
+        blocksize (int): size of the internal tiles
+        overviews (str): 'AUTO' to compute the overviews, 'FORCE_USE_EXISTING' to copy the source ones
+    """
+    resampling = "MODE" if categorical else "AVERAGE"
+
+    return [
+        f"COMPRESS={compress}",
+        "PREDICTOR=YES",
+        "LEVEL=6" if compress == "DEFLATE" else "LEVEL=9",
+        f"BLOCKSIZE={blocksize}",
+        f"OVERVIEWS={overviews}",
+        f"RESAMPLING={resampling}",
+        "NUM_THREADS=ALL_CPUS",
+        "BIGTIFF=IF_SAFER",
+    ]
+
+
+def write_cog(
+    array,
+    path,
+    geo_t,
+    proj,
+    dtype=None,
+    nodata=None,
+    categorical=False,
+    compress="DEFLATE",
+    overviews=None,
+):
+    """Write an array as a Cloud-Optimized GeoTIFF.
+
+    The file is internally tiled, compressed with a predictor by all the
+    CPUs, and carries its own overviews so it opens fast in any GIS.
+
+    Args:
+        array (np.ndarray, np.ma.MaskedArray): 2D array to write, masked pixels are set to nodata
+        path (str, Path): output file
+        geo_t (tuple): gdal geotransform of the array
+        proj (str): WKT projection of the array
+        dtype (int): gdal data type, guessed from the array if None
+        nodata (float): nodata value, defaults to NODATA of the data type
+        categorical (bool): whether the values are classes, see cog_options
+        compress (str): 'DEFLATE' or 'ZSTD'
+        overviews (list): arrays reduced by 2, 4, 8..., embedded as overviews
+            instead of letting gdal compute them, see Pyramid.overview_factors
+
+    Returns:
+        (Path): path of the written file
+    """
+    dtype = gdal_dtype(array) if dtype is None else dtype
+    nodata = NODATA[dtype] if nodata is None else nodata
+
+    data = to_raster_array(array, dtype, nodata)
+
+    # Build the raster in memory, the COG driver can only create copies
+    y_size, x_size = data.shape
+    mem = gdal.GetDriverByName("MEM").Create("", x_size, y_size, 1, dtype)
+    mem.SetGeoTransform(geo_t)
+    mem.SetProjection(proj)
+    band = mem.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+    band.WriteArray(data)
+
+    if overviews:
+        mem.BuildOverviews("NONE", [2 ** (i + 1) for i in range(len(overviews))])
+        for i, overview in enumerate(overviews):
+            band.GetOverview(i).WriteArray(to_raster_array(overview, dtype, nodata))
+
+    path = Path(path)
+    options = cog_options(
+        categorical,
+        compress,
+        overviews="FORCE_USE_EXISTING" if overviews else "AUTO",
+    )
+    gdal.GetDriverByName("COG").CreateCopy(str(path), mem, options=options)
+    mem = None
+
+    return path
+
+
+def to_cog(src_path, dst_path, categorical=False, compress="DEFLATE"):
+    """Convert a GeoTIFF file into a Cloud-Optimized GeoTIFF.
+
+    GDAL reads the source by blocks, so it's suited to outputs too big to be
+    held in memory.
+
+    Args:
+        src_path (str, Path): GeoTIFF to convert
+        dst_path (str, Path): output file
+        categorical (bool): whether the values are classes, see cog_options
+        compress (str): 'DEFLATE' or 'ZSTD'
+
+    Returns:
+        (Path): path of the written file
+    """
+    src = gdal.Open(str(src_path))
+    options = cog_options(categorical, compress)
+    gdal.GetDriverByName("COG").CreateCopy(str(dst_path), src, options=options)
+    src = None
+
+    return Path(dst_path)
+
+
+def mosaic(src_paths, dst_path, categorical=False, compress="DEFLATE"):
+    """Mosaic the GeoTIFF files of adjacent tiles into a Cloud-Optimized GeoTIFF.
+
+    The files are assembled in a temporary VRT, so the mosaic is written
+    by blocks without holding the tiles in memory.
+
+    Args:
+        src_paths (list): GeoTIFF files to mosaic, with the same data type and nodata
+        dst_path (str, Path): output file
+        categorical (bool): whether the values are classes, see cog_options
+        compress (str): 'DEFLATE' or 'ZSTD'
+
+    Returns:
+        (Path): path of the written file
+    """
+    dst_path = Path(dst_path)
+    vrt_path = dst_path.with_suffix(".vrt")
+
+    try:
+        vrt = gdal.BuildVRT(str(vrt_path), [str(path) for path in src_paths])
+        vrt.FlushCache()
+        del vrt
+        to_cog(vrt_path, dst_path, categorical, compress)
+    finally:
+        vrt_path.unlink(missing_ok=True)
+
+    return dst_path
@@ -1,20 +1,24 @@
-import os
 from datetime import datetime
 
 import ipyvuetify as v
-from biota import download as dw
-from ipywidgets import Output
 from sepal_ui import sepalwidgets as sw
 from sepal_ui.scripts import utils as su
 from traitlets import Bool, CFloat, CInt, Float, Int, Unicode, link
 
 from component.message import cm
 from component.parameter import *
+from component.scripts.batch import read_geometry
+from component.scripts.download import *
 from component.scripts.scripts import *
 from component.widget import *
 
 
 class Parameters(v.Layout):
+    @property
+    def PARAMETER_FILE(self):
+        """Biota calibration parameter file, only resolved when processing."""
+        return get_parameter_file()
+
     def __init__(self, **kwargs):
         # Widget classes
         self.class_ = "flex-column pa-2"
@@ -27,7 +31,7 @@ class Parameters(v.Layout):
         self.root_dir = root_dir
         self.data_dir = data_dir
         self.output_dir = output_dir
-        self.PARAMETER_FILE = parameter_file
+        self.cache_dir = cache_dir
 
         self.map_tile = MapTile(parameters=self)
 
@@ -37,9 +41,8 @@ class Parameters(v.Layout):
 
         # Alerts
         self.w_alert = sw.Alert(children=[cm.param.sel_param]).show()
-        self.ou_progress = Output()
-
-        self.progress_alert = sw.Alert(children=[self.ou_progress]).hide()
+        self.progress_alert = sw.Alert().hide()
+        self.progress_status = {}
 
         self.children = [
             v.Card(
@@ -77,6 +80,28 @@ class Parameters(v.Layout):
 
         # Events
         self.required.w_download.on_event("click", self._download_event)
+        self.required.observe(self._on_grid_change, "grid")
+        self.required.w_aoi_file.observe(self._on_aoi_file, "v_model")
+        self.required.w_clear_aoi.on_event("click", self._clear_aoi)
+
+    def _on_grid_change(self, change):
+        """Show the AOI and the downloaded tiles of the selected grid."""
+        self.map_tile.show_available(change["new"])
+        self.map_tile.show_square(change["new"])
+
+    def _on_aoi_file(self, change):
+        """Use the polygons of the selected vector file as AOI."""
+        if not change["new"]:
+            return
+
+        try:
+            self.map_tile.set_aoi(read_geometry(change["new"]))
+        except Exception as e:
+            self.w_alert.add_msg(f"{e}", type_="error")
+
+    def _clear_aoi(self, *args):
+        """Compute the whole tiles again."""
+        self.map_tile.set_aoi(None)
 
     def _download_event(self, *args):
         years = [
@@ -86,61 +111,67 @@ class Parameters(v.Layout):
         lon = round_(self.required.lon, self.required.grid, "lon")
         assert years != [], assert_errors(self, cm.error.at_least_year)
 
-        with self.ou_progress:
-            self.ou_progress.clear_output()
-            self.progress_alert.show()
+        self._download(lat, lon, years)
 
-            for y in years:
-                try:
-                    self.progress_alert.type = "info"
-                    self._download(lat, lon, y)
-                    self.progress_alert.type = "success"
-                except:
-                    pass
+    def _download(self, lat, lon, years):
+        """Download all the years at once and decompress them.
 
-    def _download(self, *args):
-        lat, lon, y = args
-        self.w_alert.add_msg(cm.alert.downloading.format(y, lat, lon), type_="info")
+        * This function is decorated by loading
 
+        """
         large_tile = True
         if self.required.grid == 1:
             large_tile = False
 
-        try:
-            dw.download(
-                lat,
-                lon,
-                y,
-                large_tile=large_tile,
-                output_dir=self.data_dir,
-                verbose=True,
-            )
-        except ValueError as e:
-            if "already exists" in next(iter(e.args)):
-                # To those files that were downloaded but un-decompressed
-                pass
-
-        self.w_alert.add_msg(cm.alert.decompressing.format(y), type_="info")
-        self._decompress()
-
-        self.w_alert.add_msg(cm.alert.done_down.format(y, lat, lon), type_="success")
-
-    def _decompress(self):
-        tar_files = list(self.data_dir.glob("*.tar.gz")) + list(
-            self.data_dir.glob("*.zip")
+        self.progress_status = {}
+        self.progress_alert.type = "info"
+        self.progress_alert.show()
+
+        scheduler = DownloadScheduler(
+            self.data_dir, large_tile=large_tile, callback=self._update_progress
+        )
+        # Archives are decompressed as soon as their download finishes
+        results = download_and_extract(
+            scheduler,
+            [(lat, lon, y) for y in years],
+            callback=lambda archive: self.w_alert.add_msg(
+                cm.alert.decompressingtar.format(archive.name), type_="info"
+            ),
+        )
+
+        self.map_tile.show_available(self.required.grid)
+
+        failed = [
+            str(year)
+            for (_, _, year), result in results.items()
+            if isinstance(result, Exception)
+        ]
+        if failed:
+            self.progress_alert.type = "error"
+            raise Exception(cm.error.download_failed.format(", ".join(failed)))
+
+        self.progress_alert.type = "success"
+        self.w_alert.add_msg(
+            cm.alert.done_down.format(", ".join(str(y) for y in years), lat, lon),
+            type_="success",
         )
 
-        for tar in tar_files:
-            if not os.path.exists(os.path.join(self.data_dir, tar.name[:-7])):
-                self.w_alert.add_msg(
-                    cm.alert.decompressingtar.format(tar.name), type_="info"
-                )
-                try:
-                    # If there's not file, it will raise an exception and will stop the execution
-                    dw.decompress(str(tar))
-                    self.w_alert.add_msg(cm.alert.done_unzip, type_="success")
-                except:
-                    continue
+    def _update_progress(self, request, status, **info):
+        """Show the status of every requested download in progress_alert."""
+        lat, lon, year = request
+        messages = {
+            QUEUED: cm.alert.queued,
+            DOWNLOADING: cm.alert.downloading,
+            RETRYING: cm.alert.retrying,
+            DONE: cm.alert.done_down,
+            FAILED: cm.alert.failed_down,
+            AVAILABLE: cm.alert.available,
+        }
+
+        self.progress_status[request] = messages[status].format(year, lat, lon, **info)
+        self.progress_alert.children = [
+            v.Html(tag="div", children=[msg]) for msg in self.progress_status.values()
+        ]
 
 
 class Select(v.Select, sw.SepalWidget):
@@ -210,10 +241,18 @@ class Required(v.Card):
             v_model=self.grid,
             children=[
                 v.Radio(label=cm.param.req._1grid, value=1),
-                #             v.Radio(label=cm.param.req._5grid, value=5)
+                v.Radio(label=cm.param.req._5grid, value=5),
             ],
         )
 
+        self.w_aoi_file = sw.FileInput(
+            [".geojson", ".json", ".shp", ".gpkg", ".kml"],
+            label=cm.param.req.aoi_file,
+        )
+        self.w_clear_aoi = sw.Btn(
+            cm.param.req.clear_aoi, small=True, outlined=True, class_="mb-4"
+        )
+
         self.w_download = sw.Btn(cm.param.req.download, class_="pl-5")
 
         link((w_lon, "v_model"), (self, "lon"))
@@ -230,6 +269,9 @@ class Required(v.Card):
             self.w_year_1,
             self.w_year_2,
             w_grid,
+            v.CardText(children=[cm.param.req.aoi_description]),
+            self.w_aoi_file,
+            self.w_clear_aoi,
             self.w_download,
         ]
 
@@ -278,9 +320,14 @@ class Optional(v.Card):
         w_window_size = v.TextField(
             label=cm.param.opt.window_size.name, type="number", v_model=self.window_size
         )
-        w_forest_threshold = v.TextField(
+        # Only the woody cover is recomputed when it moves, see Process
+        w_forest_threshold = v.Slider(
             label=cm.param.opt.forest_threshold.name,
-            type="number",
+            min=0,
+            max=50,
+            step=0.5,
+            thumb_label="always",
+            class_="mt-8",
             v_model=self.forest_threshold,
         )
         w_area_threshold = v.TextField(
@@ -1,21 +1,59 @@
-import biota
-import numpy as np
-
-try:
-    from osgeo import gdal
-except ImportError:
-    import gdal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import ipyvuetify as v
-from ipywidgets import Output, jslink
+from ipywidgets import jslink
 from sepal_ui import sepalwidgets as sw
 from sepal_ui.scripts import utils as su
 from traitlets import Bool, List, link, observe
 
 from ..message import cm
+from ..scripts.batch import run_large_tile
+from ..scripts.cache import ChangeTileManager, DiskCache, TileCache
+from ..scripts.display import CATEGORICAL_DISPLAY, plot_sweep
+from ..scripts.pipeline import (
+    CATEGORICAL_OUTPUTS,
+    CHANGE_OUTPUTS,
+    OPTIONS,
+    OUTPUTS,
+    WOODY_OPTIONS,
+    Pipeline,
+)
+from ..scripts.profiling import Profiler
+from ..scripts.pyramid import Pyramid
 from ..scripts.scripts import *
 from ..widget.custom_widgets import *
 
+# Attribute name of each output, its widget is w_<name>
+ATTRIBUTES = {name: attr for attr, name in OUTPUTS.items()}
+
+# Change outputs classified from the woody cover of both years
+WOODY_CHANGE_OUTPUTS = ["Change type", "Deforestation risk"]
+
+
+class RunResult:
+    def __init__(self, pipeline):
+        """Tiles and outputs of a single run, filled in the background.
+
+        Each run fills a new result, the UI keeps a reference to the one it
+        reads, so it never mixes the outputs of several runs or tiles.
+
+        Args:
+            pipeline (Pipeline): pipeline of the run, its options and AOI are
+                the ones of the outputs, see Process._write_all
+        """
+        self.pipeline = pipeline
+
+        # Clipped tiles keyed by tile_1 and tile_2
+        self.tiles = {}
+
+        # Output arrays keyed by output name, see OUTPUTS values
+        self.outputs = {}
+
+        # Overviews of the outputs, shared by display and write
+        self.pyramids = {}
+
 
 class Process(v.Card):
     # Process widgets
@@ -35,18 +73,33 @@ class Process(v.Card):
         super().__init__(**kwargs)
 
         self.param = parameters
-        self.tile_1 = None
-        self.tile_2 = None
-        self.change_tile = None
-        self.gamma0_tile = None
-        self.biomass_tile = None
-        self.biomass_ch_tile = None
-        self.forest_ch_tile = None
-        self.forest_cov_tile = None
-        self.def_risk_tile = None
+
+        # Tiles and outputs of the last run, replaced when a run starts
+        self.result = RunResult(None)
+
+        # Runs are computed one after the other in the background
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.runs = []
+
+        # Incremented on each threshold change, only the last one is computed
+        self.threshold_changes = 0
+
+        # Colour of each class of the categorical outputs, replacing the presets,
+        # see set_palette
+        self.palettes = {}
+
+        # Keep loaded tiles and share the change tile between all the change outputs
+        self.tile_cache = TileCache(maxsize=2)
+        self.change_manager = ChangeTileManager()
+
+        # Derived arrays persist between sessions
+        self.disk_cache = DiskCache(self.param.cache_dir)
 
         self.w_alert = sw.Alert(children=[cm.alert.select_proc]).show()
 
+        # Time and memory used by each stage of the last run
+        self.w_profile = v.Html(tag="div", class_="px-4", children=[])
+
         w_forest_p = v.Checkbox(
             label=cm.outputs.forest_property, class_="pl-5", v_model=self.forest_p
         )
@@ -76,15 +129,6 @@ class Process(v.Card):
         jslink((w_year_2, "v_model"), (self.param.required, "year_2"))
 
         # Output widgets
-        self.ou_display = Output()
-        self.out_dialog = v.Dialog(
-            children=[v.Card(color="white", children=[self.ou_display])],
-            v_model=False,
-            max_width=436,
-            overlay_color="black",
-            overlay_opacity=0.7,
-        )
-
         self.w_select_output = v.Select(
             class_="ps-4",
             items=self.true_cb,
@@ -92,9 +136,27 @@ class Process(v.Card):
             label=cm.outputs.select_label,
         )
         self.btn_process = sw.Btn(cm.buttons.get_outputs.label, class_="pl-5")
+        self.btn_cancel = sw.Btn(
+            cm.buttons.cancel, class_="ml-2", color="error", outlined=True
+        )
 
         self.btn_add_map = sw.Btn(cm.buttons.display, class_="ms-4")
         self.btn_write_raster = sw.Btn(cm.buttons.write, class_="ml-5")
+        self.btn_write_all = sw.Btn(cm.buttons.write_all, class_="ml-5")
+
+        # Threshold sweep widgets, thresholds are separated by commas
+        self.w_forest_thresholds = v.TextField(
+            class_="px-4",
+            label=cm.sweep.forest_thresholds,
+            v_model="5, 10, 15, 20",
+        )
+        self.w_magnitude_thresholds = v.TextField(
+            class_="px-4",
+            label=cm.sweep.magnitude_thresholds,
+            v_model="5, 10, 15, 20, 25",
+        )
+        self.btn_sweep = sw.Btn(cm.buttons.sweep, class_="ms-4")
+        self.w_sweep = v.Html(tag="div", class_="px-4", children=[])
 
         # Linked widgets
 
@@ -156,18 +218,31 @@ class Process(v.Card):
                     sw.Tooltip(
                         self.btn_process, cm.buttons.get_outputs.tooltip, bottom=True
                     ),
+                    self.btn_cancel,
                 ],
             ),
             self.w_alert,
+            self.w_profile,
             v.Card(
                 class_="pb-4",
                 children=[
-                    self.out_dialog,
                     v.CardTitle(children=[cm.process.title_display]),
                     v.CardText(children=[cm.process.intro_display]),
                     self.w_select_output,
                     self.btn_add_map,
                     self.btn_write_raster,
+                    self.btn_write_all,
+                ],
+            ),
+            v.Card(
+                class_="pb-4",
+                children=[
+                    v.CardTitle(children=[cm.process.title_sweep]),
+                    v.CardText(children=[cm.process.intro_sweep]),
+                    self.w_forest_thresholds,
+                    self.w_magnitude_thresholds,
+                    self.btn_sweep,
+                    self.w_sweep,
                 ],
             ),
         ]
@@ -179,15 +254,77 @@ class Process(v.Card):
         self._write_raster = su.loading_button(self.w_alert, self.btn_write_raster)(
             self._write_raster
         )
+        self._write_all = su.loading_button(self.w_alert, self.btn_write_all)(
+            self._write_all
+        )
         self._process = su.loading_button(self.w_alert, self.btn_process)(self._process)
         self._display = su.loading_button(self.w_alert, self.btn_add_map)(self._display)
+        self._sweep = su.loading_button(self.w_alert, self.btn_sweep)(self._sweep)
 
         self.btn_process.on_event("click", self._process)
+        self.btn_cancel.on_event("click", self._cancel)
         self.btn_add_map.on_event("click", self._display)
         self.btn_write_raster.on_event("click", self._write_raster)
+        self.btn_write_all.on_event("click", self._write_all)
+        self.btn_sweep.on_event("click", self._sweep)
 
         self.param.required.w_years.observe(self.hide_change)
 
+        # Tiles are keyed by coordinates, year and loading options, and the
+        # change tile by its tiles, so the caches are never cleared while a
+        # run may still use them. The thresholds are applied to the cached tiles.
+        self.param.optional.observe(self._update_forest_cover, WOODY_OPTIONS)
+
+    def _update_forest_cover(self, change):
+        """Recompute the forest cover with the new thresholds, from the kept AGB.
+
+        It's queued after the running computations, and only done if the
+        forest cover was already computed. While a slider moves, the updates
+        still queued are skipped for the last one.
+        """
+        result = self.result
+        if "Forest cover" not in result.outputs:
+            return
+
+        pipeline, tile = self._get_pipeline(result), result.tiles["tile_1"]
+
+        self.threshold_changes += 1
+        threshold_change = self.threshold_changes
+
+        def update():
+            # A newer threshold is queued, or a run started since then
+            if threshold_change != self.threshold_changes or result is not self.result:
+                return
+
+            try:
+                self._on_output_start("Forest cover")
+                array = pipeline.get_woody_cover(tile)
+            except Exception as e:
+                self._on_output_error("Forest cover", e)
+                return
+
+            # The outputs of the run now follow the new thresholds, drop the
+            # change classified with the previous ones
+            stale = [
+                name
+                for name in WOODY_CHANGE_OUTPUTS
+                if result.outputs.pop(name, None) is not None
+            ]
+            for name in stale:
+                result.pyramids.pop(name, None)
+            result.pipeline = pipeline
+            self._on_output_done(result, "Forest cover", array)
+
+            if stale:
+                self.w_alert.add_msg(
+                    cm.alert.stale_outputs.format(", ".join(stale)), type_="warning"
+                )
+
+            if self.param.map_tile.has_output("Forest cover"):
+                self._show_output(result, "Forest cover", fit=False)
+
+        self.executor.submit(update)
+
     def hide_change(self, change):
         """Disable change properties if there is only one year selected."""
         if change["new"] == "Single year":
@@ -223,41 +360,110 @@ class Process(v.Card):
             if self.param.required.year_1 >= self.param.required.year_2:
                 raise Exception(cm.error.y1_lt_y2)
 
-    def _load_tile(self, year):
-        tile = biota.LoadTile(
-            str(self.param.data_dir),
-            round_(self.param.required.lat, self.param.required.grid, "lat"),
-            round_(self.param.required.lon, self.param.required.grid, "lon"),
-            year,
-            parameter_file=self.param.PARAMETER_FILE,
-            forest_threshold=self.param.optional.forest_threshold,
-            area_threshold=self.param.optional.area_threshold,
-            downsample_factor=self.param.optional.downsample_factor,
-            lee_filter=self.param.optional.lee_filter,
-            window_size=self.param.optional.window_size,
-            contiguity=self.param.optional.contiguity,
-            output_dir=str(self.param.output_dir),
+    def _get_pipeline(self, result=None):
+        """Return a pipeline with the current optional parameters and the shared caches.
+
+        The outputs are clipped to the AOI of the map, if any. Its stages are
+        always profiled, see _show_profile.
+
+        Args:
+            result (RunResult): run whose AOI and options are kept, only the
+                woody cover thresholds are then read from the widgets
+        """
+        aoi = self.param.map_tile.aoi
+        options = {name: getattr(self.param.optional, name) for name in OPTIONS}
+
+        if result is not None:
+            aoi = result.pipeline.aoi
+            options = {
+                **result.pipeline.options,
+                **{name: options[name] for name in WOODY_OPTIONS},
+            }
+
+        return Pipeline(
+            self.param.data_dir,
+            self.param.output_dir,
+            self.param.PARAMETER_FILE,
+            tile_cache=self.tile_cache,
+            change_manager=self.change_manager,
+            disk_cache=self.disk_cache,
+            profiler=Profiler(enabled=True),
+            aoi=aoi,
+            **options,
         )
-        return tile
 
-    def _get_tiles_dictionary(self):
-        # Wrap attributes, widget, and tile in a dictionary
+    def _show_profile(self, profiler):
+        """Show the time and memory used by each stage of a pipeline."""
+        header = [
+            cm.profile.stage,
+            cm.profile.calls,
+            cm.profile.wall,
+            cm.profile.cpu,
+            cm.profile.memory,
+        ]
+        rows = [
+            [
+                stage,
+                values["calls"],
+                f"{values['wall']:.2f}",
+                f"{values['cpu']:.2f}",
+                f"{values['peak_rss'] / 2**20:.0f}",
+            ]
+            for stage, values in profiler.summary().items()
+        ]
+
+        self.w_profile.children = [self._table(header, rows)]
+
+    def _table(self, header, rows):
+        """Return a dense table of the given rows."""
+
+        def row(tag, values):
+            cells = [v.Html(tag=tag, children=[str(value)]) for value in values]
+            return v.Html(tag="tr", children=cells)
+
+        return v.SimpleTable(
+            dense=True,
+            children=[
+                v.Html(tag="thead", children=[row("th", header)]),
+                v.Html(tag="tbody", children=[row("td", r) for r in rows]),
+            ],
+        )
+
+    def _get_tiles_dictionary(self, result=None):
+        """Wrap attributes, widget, and tile in a dictionary.
+
+        Args:
+            result (RunResult): run of the tiles, the last one by default
+        """
+        outputs = (result or self.result).outputs
         self.TILES = {
             # label : [attribute, widget, tile]
-            cm.outputs.gamma: [self.gamma0, self.w_gamma0, self.gamma0_tile],
-            cm.outputs.biomass: [self.biomass, self.w_biomass, self.biomass_tile],
+            cm.outputs.gamma: [self.gamma0, self.w_gamma0, outputs.get("Gamma0")],
+            cm.outputs.biomass: [
+                self.biomass,
+                self.w_biomass,
+                outputs.get("Biomass"),
+            ],
             cm.outputs.forest_cov: [
                 self.forest_cov,
                 self.w_forest_cov,
-                self.forest_cov_tile,
+                outputs.get("Forest cover"),
+            ],
+            cm.outputs.ch_type: [
+                self.forest_ch,
+                self.w_forest_ch,
+                outputs.get("Change type"),
             ],
-            cm.outputs.ch_type: [self.forest_ch, self.w_forest_ch, self.forest_ch_tile],
             cm.outputs.biomass_ch: [
                 self.biomass_ch,
                 self.w_biomass_ch,
-                self.biomass_ch_tile,
+                outputs.get("Biomass change"),
+            ],
+            cm.outputs.def_risk: [
+                self.def_risk,
+                self.w_def_risk,
+                outputs.get("Deforestation risk"),
             ],
-            cm.outputs.def_risk: [self.def_risk, self.w_def_risk, self.def_risk_tile],
         }
 
     def _get_processed_tiles(self):
@@ -267,87 +473,193 @@ class Process(v.Card):
             name for name, v in self.TILES.items() if v[2] is not None
         ]
 
+    def _get_pyramid(self, result, tile_name):
+        """Return the pyramid of a processed output of a run, only created once."""
+        if tile_name not in result.pyramids:
+            self._get_tiles_dictionary(result)
+            result.pyramids[tile_name] = Pyramid(
+                self.TILES[tile_name][2],
+                result.tiles["tile_1"].geo_t,
+                categorical=tile_name in CATEGORICAL_OUTPUTS,
+            )
+
+        return result.pyramids[tile_name]
+
     def _process(self, *args):
         """Event trigger when btn_process is clicked.
 
+        The outputs are computed in the background, the inputs are read at
+        click time so the next tile can be prepared while this one computes.
+        Runs started while another one is computing are queued.
+
         * This function is decorated by loading
 
         """
         # Raise error if validation doesn't pass
         self._validate_inputs()
 
-        # Create tiles if years are selected.
-        if self.param.required.year_1:
-            self.tile_1 = self._load_tile(int(self.param.required.year_1))
-        if self.param.required.year_2:
-            self.tile_2 = self._load_tile(int(self.param.required.year_2))
-
-        for process in self.true_cb:
-            self.w_alert.reset()
-            if process in ["Gamma0", "Biomass", "Forest cover"]:
-                self.w_alert.type = "info"
-                self.w_alert.append_msg(cm.outputs.computing.format(process))
-
-                if process == "Gamma0":
-                    self.w_gamma0.running()
-                    self.gamma0_tile = self.tile_1.getGamma0(
-                        polarisation=self.param.optional.polarisation, units="decibels"
-                    )
-                    self.w_gamma0.done()
-                elif process == "Biomass":
-                    self.w_biomass.running()
-                    self.biomass_tile = self.tile_1.getAGB()
-                    self.w_biomass.done()
-
-                elif process == "Forest cover":
-                    self.w_forest_cov.running()
-                    self.forest_cov_tile = self.tile_1.getWoodyCover()
-                    self.w_forest_cov.done()
-
-                self.w_alert.append_msg(cm.outputs.ready.format(process))
-                self.w_alert.type = "success"
-
-            elif process in ["Biomass change", "Change type", "Deforestation risk"]:
-                self.w_alert.add_msg(cm.outputs.retrieving_ch)
-                assert all(
-                    (self.param.required.year_1, self.param.required.year_2)
-                ), assert_errors(self, cm.error.both_years)
-                # Compute change tile
-                self.change_tile = biota.LoadChange(
-                    self.tile_1,
-                    self.tile_2,
-                    change_area_threshold=self.param.optional.change_area_threshold,
-                    change_magnitude_threshold=self.param.optional.change_magnitude_threshold,
-                    contiguity=self.param.optional.contiguity,
-                )
+        if not self.true_cb:
+            raise Exception(cm.error.at_least_process)
 
-                self.w_alert.add_msg(cm.outputs.computing.format(process))
-                self.w_alert.type_ = "info"
+        years = [
+            int(year)
+            for year in [self.param.required.year_1, self.param.required.year_2]
+            if year
+        ]
+        if set(self.true_cb) & set(CHANGE_OUTPUTS.values()):
+            assert len(years) == 2, assert_errors(self, cm.error.both_years)
+
+        run = {
+            "pipeline": self._get_pipeline(),
+            "lat": round_(self.param.required.lat, self.param.required.grid, "lat"),
+            "lon": round_(self.param.required.lon, self.param.required.grid, "lon"),
+            "years": years,
+            "outputs": list(self.true_cb),
+            "large_tile": self.param.required.grid != 1,
+            "cancel": threading.Event(),
+        }
 
-                if process == "Biomass change":
-                    self.w_biomass_ch.running()
-                    self.biomass_ch_tile = self.change_tile.getAGBChange()
-                    self.w_biomass_ch.done()
+        # Runs still waiting or computing
+        self.runs = [(f, cancel) for f, cancel in self.runs if not f.done()]
+        if self.runs:
+            self.w_alert.add_msg(
+                cm.alert.queued_run.format(len(self.runs)), type_="info"
+            )
 
-                elif process == "Change type":
-                    self.w_forest_ch.running()
-                    self.change_tile.getChangeType()
-                    self.forest_ch_tile = self.change_tile.ChangeCode
-                    self.w_forest_ch.done()
+        future = self.executor.submit(self._run, run)
+        self.runs.append((future, run["cancel"]))
 
-                elif process == "Deforestation risk":
-                    self.w_def_risk.running()
-                    self.def_risk_tile = self.change_tile.getRiskMap()
-                    self.w_def_risk.done()
+    def _run(self, run):
+        """Compute the outputs of a run, called in the background.
 
-                self.w_alert.append_msg(cm.outputs.ready.format(process))
-                self.w_alert.type = "success"
+        Args:
+            run (dict): pipeline, tile coordinates, years, outputs and cancel event
+        """
+        if run["large_tile"]:
+            return self._run_large_tile(run)
+
+        self.w_alert.add_msg(cm.alert.loading_tiles, type_="info")
+
+        # Outputs of the previous runs are dropped, not mixed with this one
+        result = RunResult(run["pipeline"])
+        self.result = result
+        self._get_processed_tiles()
+
+        # Each intermediate array is computed once, both years in parallel
+        try:
+            run["pipeline"].compute_all(
+                run["lat"],
+                run["lon"],
+                run["years"],
+                run["outputs"],
+                on_start=self._on_output_start,
+                on_done=partial(self._on_output_done, result),
+                on_error=self._on_output_error,
+                cancel=run["cancel"],
+            )
+        except Exception as e:
+            self.w_alert.add_msg(f"{e}", type_="error")
+            return
+
+        if run["cancel"].is_set():
+            self.w_alert.add_msg(cm.alert.cancelled, type_="warning")
+
+        self._show_profile(run["pipeline"].profiler)
+
+    def _run_large_tile(self, run):
+        """Compute and write the outputs of a 5x5 tile, called in the background.
+
+        Its 1x1 tiles are computed in parallel processes and the outputs are
+        mosaicked in the output directory, a 5x5 output is too big to be
+        kept in memory and displayed.
+
+        Args:
+            run (dict): see _run, the run can't be cancelled once started
+        """
+        pipeline = run["pipeline"]
+        widgets = [getattr(self, f"w_{ATTRIBUTES[name]}") for name in run["outputs"]]
+
+        self.w_alert.add_msg(cm.alert.large_tile_running, type_="info")
+        for widget in widgets:
+            widget.running()
+
+        try:
+            paths, failed = run_large_tile(
+                run["lat"],
+                run["lon"],
+                run["years"],
+                run["outputs"],
+                pipeline.data_dir,
+                pipeline.output_dir,
+                pipeline.parameter_file,
+                cache_dir=self.param.cache_dir,
+                aoi=pipeline.aoi,
+                **pipeline.options,
+            )
+        except Exception as e:
+            for widget in widgets:
+                widget.error()
+            self.w_alert.add_msg(f"{e}", type_="error")
+            return
+
+        for name, widget in zip(run["outputs"], widgets):
+            if name in paths:
+                widget.done()
             else:
-                self.w_alert.append_msg(cm.error.at_least_process)
+                widget.error()
+
+        if failed:
+            tiles = ", ".join(f"({lat}, {lon})" for lat, lon in failed)
+            self.w_alert.add_msg(
+                cm.error.large_tile_failed.format(tiles), type_="error"
+            )
+
+        self.w_alert.add_msg(
+            cm.alert.large_tile_done.format(len(paths), self.param.output_dir),
+            type_="success",
+        )
+
+    def _on_output_start(self, process):
+        """Show an output is being computed."""
+        if process in ATTRIBUTES:
+            self.w_alert.add_msg(cm.outputs.computing.format(process), type_="info")
+            getattr(self, f"w_{ATTRIBUTES[process]}").running()
+
+    def _on_output_done(self, result, process, array):
+        """Keep a computed output in the result of its run and show it's ready."""
+        # Tiles are loaded before any output
+        if process in ["tile_1", "tile_2"]:
+            result.tiles[process] = array
+            return
+
+        result.outputs[process] = array
+        result.pyramids.pop(process, None)
+
+        getattr(self, f"w_{ATTRIBUTES[process]}").done()
+        self.w_alert.add_msg(cm.outputs.ready.format(process), type_="success")
 
         # Update state of display/write select widget
         self._get_processed_tiles()
 
+    def _on_output_error(self, process, error):
+        """Show an output failed, the outputs not depending on it are still computed."""
+        if process not in ATTRIBUTES:
+            self.w_alert.add_msg(f"{error}", type_="error")
+            return
+
+        getattr(self, f"w_{ATTRIBUTES[process]}").error()
+        self.w_alert.add_msg(f"{process}: {error}", type_="error")
+
+    def _cancel(self, *args):
+        """Stop the remaining outputs of the current run and drop the queued runs."""
+        for future, cancel in self.runs:
+            future.cancel()
+            cancel.set()
+
+        self.runs = [
+            (future, cancel) for future, cancel in self.runs if future.running()
+        ]
+
     def _write_raster(self, *args):
         """Write processed raster.
 
@@ -361,23 +673,50 @@ class Process(v.Card):
         tile_name = self.w_select_output.v_model
 
         # Get tile from selected dropdown
-        self._get_tiles_dictionary()
+        result = self.result
+        self._get_tiles_dictionary(result)
         tile = self.TILES[tile_name][2]
         assert tile is not None, assert_errors(
             self, cm.error.before_write.format(tile_name)
         )
 
-        if tile_name in ["Biomass", "Gamma0", "Biomass change", "Deforestation risk"]:
-            self.tile_1._LoadTile__outputGeoTiff(tile, tile_name)
-
-        elif tile_name in ["Change type", "Forest cover"]:
-            self.tile_1._LoadTile__outputGeoTiff(tile, tile_name, dtype=gdal.GDT_Byte)
+        # Written with the options and AOI it was computed with
+        pipeline = result.pipeline
+        pipeline.write(tile_name, self._get_pyramid(result, tile_name), **result.tiles)
+        self._show_profile(pipeline.profiler)
 
         self.w_alert.add_msg(
             cm.alert.success_export.format(tile_name, self.param.output_dir),
             type_="success",
         )
 
+    def _write_all(self, *args):
+        """Write all the processed rasters and their manifest.
+
+        * This function is decorated by loading
+
+        """
+        result = self.result
+        self._get_tiles_dictionary(result)
+        arrays = {
+            name: self._get_pyramid(result, name)
+            for name, v in self.TILES.items()
+            if v[2] is not None
+        }
+        assert arrays, assert_errors(self, cm.error.nothing_to_write)
+
+        # The manifest lists the options and AOI of the run, not the current ones
+        pipeline = result.pipeline
+        manifest = pipeline.write_all(arrays, **result.tiles)
+        self._show_profile(pipeline.profiler)
+
+        self.w_alert.add_msg(
+            cm.alert.success_export_all.format(
+                len(arrays), self.param.output_dir, manifest.name
+            ),
+            type_="success",
+        )
+
     def _display(self, *args):
         """Display processed raster.
 
@@ -391,71 +730,119 @@ class Process(v.Card):
         tile_name = self.w_select_output.v_model
 
         # Get tile from selected dropdown
-        self._get_tiles_dictionary()
+        result = self.result
+        self._get_tiles_dictionary(result)
         tile = self.TILES[tile_name][2]
         assert tile is not None, assert_errors(
             self, cm.error.before_display.format(tile_name)
         )
 
-        with self.ou_display:
-            self.ou_display.clear_output()
-            if tile_name == "Biomass":
-                title, cbartitle, vmin, vmax, cmap = "AGB", "tC/ha", 0, 40, "YlGn"
-            elif tile_name == "Gamma0":
-                title, cbartitle, vmin, vmax, cmap = (
-                    f"Gamma0 {self.param.optional.polarisation}",
-                    "decibels",
-                    -20,
-                    -10,
-                    "Greys_r",
-                )
-            elif tile_name == "Forest cover":
-                title, cbartitle, vmin, vmax, cmap = (
-                    "Woody Cover",
-                    "decibels",
-                    0,
-                    1,
-                    "summer_r",
-                )
+        self._show_output(result, tile_name)
 
-            elif tile_name == "Biomass change":
-                title, cbartitle, vmin, vmax, cmap = (
-                    "AGB Change",
-                    "tC/ha",
-                    -10,
-                    10,
-                    "YlGn",
-                )
+        self.w_alert.add_msg(cm.alert.displayed.format(tile_name), type_="success")
 
-            elif tile_name == "Change type":
-                # Hide minor gain, minor loss and nonforest in display output
-                change_code_display = np.ma.array(
-                    tile, mask=np.zeros_like(tile, dtype=bool)
-                )
-                change_code_display.mask[
-                    np.isin(change_code_display, [0, 3, 4, 255])
-                ] = True
-
-                # Overwrite current tile with new change_code_display
-                tile, title, cbartitle, vmin, vmax, cmap = (
-                    change_code_display,
-                    "Change type",
-                    "Type",
-                    1,
-                    6,
-                    "Spectral",
-                )
+    def _show_output(self, result, tile_name, fit=True):
+        """Show a processed output of a run on the map of the parameters tile."""
+        self.param.map_tile.add_output(
+            tile_name,
+            self._get_pyramid(result, tile_name),
+            polarisation=self.param.optional.polarisation,
+            palette=self.palettes.get(tile_name),
+            fit=fit,
+        )
+
+    def set_palette(self, output, palette=None):
+        """Colour the classes of a categorical output with a palette instead of its preset.
+
+        The output is drawn again if it's shown on the map.
+
+        Args:
+            output (str): name of the output, "Change type" or "Deforestation risk"
+            palette (dict): matplotlib colour of each class, the other classes
+                are transparent. None to restore the preset colours.
+
+        Example:
+            process.set_palette(
+                "Change type", {1: "#d7191c", 2: "#fdae61", 5: "#a6d96a", 6: "#1a9641"}
+            )
+        """
+        if output not in CATEGORICAL_DISPLAY:
+            raise ValueError(f"{output} isn't displayed with classes.")
+
+        if palette is None:
+            self.palettes.pop(output, None)
+        else:
+            self.palettes[output] = dict(palette)
+
+        result = self.result
+        if output in result.outputs and self.param.map_tile.has_output(output):
+            self._show_output(result, output, fit=False)
+
+    def _sweep(self, *args):
+        """Compare the forest and change areas of several thresholds.
+
+        The areas are computed from the AGB of the tiles of the last run, the
+        change areas only if both years were loaded. The sweep is queued
+        after the running computations, which may still use the tiles.
 
-            elif tile_name == "Deforestation risk":
-                title, cbartitle, vmin, vmax, cmap = (
-                    "Deforestation risk map",
-                    "Low - High risk",
-                    0,
-                    3,
-                    "autumn",
+        * This function is decorated by loading
+
+        """
+        result = self.result
+        assert "tile_1" in result.tiles, assert_errors(self, cm.error.before_sweep)
+
+        forest_thresholds = self._parse_thresholds(self.w_forest_thresholds.v_model)
+        magnitude_thresholds = self._parse_thresholds(
+            self.w_magnitude_thresholds.v_model
+        )
+
+        # The AGB is read with the options and AOI of the run
+        pipeline = self._get_pipeline(result)
+
+        def sweep():
+            try:
+                rows = pipeline.sweep_thresholds(
+                    result.tiles["tile_1"],
+                    forest_thresholds,
+                    result.tiles.get("tile_2"),
+                    magnitude_thresholds,
                 )
+            except Exception as e:
+                self.w_alert.add_msg(f"{e}", type_="error")
+                return
+
+            self._show_profile(pipeline.profiler)
+            self._show_sweep(rows)
+
+            self.w_alert.add_msg(cm.alert.sweep_done.format(len(rows)), type_="success")
+
+        self.w_alert.add_msg(cm.alert.sweeping, type_="info")
+        self.executor.submit(sweep)
+
+    def _parse_thresholds(self, text):
+        """Return the thresholds of a comma separated list."""
+        try:
+            thresholds = [float(value) for value in text.split(",") if value.strip()]
+        except ValueError:
+            raise Exception(cm.error.thresholds_list)
+
+        if not thresholds:
+            raise Exception(cm.error.thresholds_list)
+
+        return thresholds
+
+    def _show_sweep(self, rows):
+        """Show the areas of a threshold sweep as a table and a plot."""
+        labels = {name: getattr(cm.sweep.columns, name) for name in rows[0]}
+        labels["area"] = cm.sweep.area
+
+        def format_(name, value):
+            return f"{value:g}" if name.endswith("threshold") else f"{value:.0f}"
+
+        table = self._table(
+            [labels[name] for name in rows[0]],
+            [[format_(name, value) for name, value in row.items()] for row in rows],
+        )
+        plot = v.Img(src=plot_sweep(rows, labels), contain=True, class_="mt-4")
 
-            # Show arrays with showArray method from LoadTile object
-            # We are just using this method to display any tile with the given UI.lat and UI.lon
-            self.tile_1._LoadTile__showArray(tile, title, cbartitle, vmin, vmax, cmap)
-            self.out_dialog.v_model = True
+        self.w_sweep.children = [table, plot]
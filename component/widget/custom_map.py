@@ -1,14 +1,75 @@
-import geopandas as gpd
 import ipyvuetify as v
 import numpy as np
-from ipyleaflet import AwesomeIcon, GeoJSON, Marker, WidgetControl
+from ipyleaflet import (
+    AwesomeIcon,
+    DrawControl,
+    GeoJSON,
+    ImageOverlay,
+    Marker,
+    WidgetControl,
+)
 from ipywidgets import Output
 from sepal_ui import mapping as m
-from shapely.geometry import Polygon
+from shapely.geometry import Polygon, mapping, shape
 
+from component.message import cm
+from component.scripts.display import get_lut, get_preset, render, tile_bounds
+from component.scripts.download import TileCatalogue
 from component.scripts.scripts import *
 
 
+def square(lat, lon, width=1):
+    """Return the lon-lat coordinates of the square of a tile.
+
+    Args:
+        lat (int): latitude of the tile upper-left corner
+        lon (int): longitude of the tile upper-left corner
+        width (int): size of the tile in degrees
+    """
+    ul = np.array([lon, lat])
+    ur = ul + (width, 0)
+    br = ul + (width, -width)
+    bl = ul + (0, -width)
+
+    return list(list(f) for f in [ul, ur, br, bl, ul])
+
+
+class ArrayOverlay(ImageOverlay):
+    def __init__(self, output, pyramid, polarisation="HV", palette=None, **kwargs):
+        """Image layer showing an output, rendered for the map viewport.
+
+        The whole array is never sent to the map: call update with the map
+        bounds and zoom to render the visible pixels at the screen resolution.
+
+        Args:
+            output (str): name of the output, gives its display preset
+            pyramid (Pyramid): pyramid of the output, its geotransform in degrees
+            polarisation (str): polarisation shown in the Gamma0 title
+            palette (dict): colour of each class of a categorical output, see
+                display.palette_lut
+            kwargs: other arguments of ImageOverlay
+        """
+        title, _, self.vmin, self.vmax, self.cmap = get_preset(output, polarisation)
+
+        self.pyramid = pyramid
+        self.lut = get_lut(output, palette)
+
+        super().__init__(name=title, **kwargs)
+
+        self.__setattr__("_metadata", {"type": output})
+
+    def update(self, bounds, zoom):
+        """Render the array within the bounds at the zoom level."""
+        image = render(
+            self.pyramid, bounds, zoom, self.vmin, self.vmax, self.cmap, self.lut
+        )
+
+        # Keep the last image when the array is out of the viewport
+        if image is not None:
+            with self.hold_sync():
+                self.url, self.bounds = image
+
+
 class MapTile(v.Card):
     def __init__(self, parameters, *args, **kwargs):
 
@@ -23,23 +84,145 @@ class MapTile(v.Card):
         self.lat = None
         self.lon = None
 
+        # Polygon within which the outputs are computed, see set_aoi
+        self.aoi = None
+
         self.output = Output()
         control = WidgetControl(widget=self.output, position="topleft")
         self.map_.add_control(control)
 
+        style = {"shapeOptions": {"color": "#2196f3", "fillOpacity": 0.1}}
+        self.draw_control = DrawControl(
+            polygon=style, rectangle=style, circlemarker={}, polyline={}
+        )
+        self.draw_control.on_draw(self._on_draw)
+        self.map_.add_control(self.draw_control)
+
         self.map_.on_interaction(self.return_coordinates)
+        self.map_.observe(self._update_outputs, "bounds")
 
         self.children = [self.map_]
 
+        self.show_available()
+
+    def _on_draw(self, target, action, geo_json):
+        """Use the drawn polygon as AOI, the drawing is replaced by the AOI layer."""
+        if action == "created":
+            self.draw_control.clear()
+            self.set_aoi(shape(geo_json["geometry"]))
+
+    def set_aoi(self, geometry):
+        """Show the AOI and select the tile it falls in.
+
+        Args:
+            geometry (shapely.geometry): area of interest in EPSG:4326, None to
+                compute whole tiles
+        """
+        remove_layers_if(self.map_, "type", "aoi", _metadata=True)
+        self.aoi = geometry
+
+        if geometry is None:
+            return
+
+        layer = GeoJSON(
+            data=mapping(geometry),
+            style={"color": "#2196f3", "fillOpacity": 0.1},
+            name="AOI",
+        )
+        layer.__setattr__("_metadata", {"type": "aoi"})
+        self.map_.add_layer(layer)
+
+        min_lon, min_lat, max_lon, max_lat = geometry.bounds
+        self.map_.fit_bounds([[min_lat, min_lon], [max_lat, max_lon]])
+
+        # The tile containing the AOI is processed
+        point = geometry.representative_point()
+        self.lat, self.lon = point.y, point.x
+        self.param.required.lat = round(self.lat, 2)
+        self.param.required.lon = round(self.lon, 2)
+        self.show_square(self.param.required.grid)
+
+    def show_available(self, grid=1):
+        """Outline the tiles already downloaded and extracted.
+
+        Args:
+            grid (int): size of the tiles in degrees, 1 or 5
+        """
+        remove_layers_if(self.map_, "type", "available", _metadata=True)
+
+        available = TileCatalogue(self.param.data_dir).available(large_tile=grid != 1)
+        if not available:
+            return
+
+        features = [
+            {
+                "type": "Feature",
+                "properties": {"years": years},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [square(lat, lon, grid)],
+                },
+            }
+            for (lat, lon), years in available.items()
+        ]
+        layer = GeoJSON(
+            data={"type": "FeatureCollection", "features": features},
+            style={"color": "#1a9641", "dashArray": "4", "fillOpacity": 0.1},
+            name=cm.param.req.available_tiles,
+        )
+        layer.__setattr__("_metadata", {"type": "available"})
+
+        self.map_.add_layer(layer)
+
+    def add_output(self, output, pyramid, polarisation="HV", palette=None, fit=True):
+        """Show an output on the map, replacing the previous one.
+
+        Args:
+            output (str): name of the output
+            pyramid (Pyramid): pyramid of the output, its geotransform in degrees
+            polarisation (str): polarisation shown in the Gamma0 title
+            palette (dict): colour of each class of a categorical output
+            fit (bool): zoom the map to the output
+        """
+        remove_layers_if(self.map_, "type", output, _metadata=True)
+
+        layer = ArrayOverlay(output, pyramid, polarisation, palette)
+        bounds = tile_bounds(pyramid.geo_t, pyramid.shape)
+
+        # The map bounds are only known once it has been displayed
+        layer.update(self.map_.bounds or bounds, self.map_.zoom)
+        self.map_.add_layer(layer)
+        if fit:
+            self.map_.fit_bounds([list(corner) for corner in bounds])
+
+    def has_output(self, output):
+        """Check if an output is shown on the map."""
+        return any(
+            isinstance(layer, ArrayOverlay) and layer._metadata["type"] == output
+            for layer in self.map_.layers
+        )
+
+    def _update_outputs(self, change):
+        """Render the output layers for the new viewport."""
+        for layer in self.map_.layers:
+            if isinstance(layer, ArrayOverlay):
+                layer.update(change["new"], self.map_.zoom)
+
+    def get_square_coords(self, width=1):
+        """Return the lon-lat coordinates of the tile containing the selected point.
+
+        Args:
+            width (int): size of the tile in degrees, 1 or 5
+        """
+        return square(
+            round_(self.lat, width, "lat"), round_(self.lon, width, "lon"), width
+        )
+
     def get_square(self, width=1):
 
-        # lon-lat
-        ul = np.array([round_(self.lon, width, "lon"), round_(self.lat, width, "lat")])
-        ur = ul + (width, 0)
-        br = ul + (width, -width)
-        bl = ul + (0, -width)
+        coords = self.get_square_coords(width)
 
-        coords = list(list(f) for f in [ul, ur, br, bl, ul])
+        import geopandas as gpd
 
         data = gpd.GeoDataFrame(geometry=[Polygon(coords)]).__geo_interface__
 
@@ -48,6 +231,26 @@ class MapTile(v.Card):
 
         return geojson
 
+    def show_square(self, width=1):
+        """Show the square of the tile containing the selected point.
+
+        The AOI is cleared when it doesn't intersect the tile anymore.
+
+        Args:
+            width (int): size of the tile in degrees, 1 or 5
+        """
+        if self.lat is None:
+            return
+
+        # An AOI outside of the tile would leave nothing to compute
+        if self.aoi is not None and not self.aoi.intersects(
+            Polygon(self.get_square_coords(width))
+        ):
+            self.set_aoi(None)
+
+        remove_layers_if(self.map_, "type", "square", _metadata=True)
+        self.map_.add_layer(self.get_square(width=width))
+
     def return_coordinates(self, **kwargs):
 
         with self.output:
@@ -87,7 +290,7 @@ class MapTile(v.Card):
             self.map_.add_layer(marker)
 
             # Create a square rounding the point
-            self.map_.add_layer(self.get_square(width=self.param.required.grid))
+            self.show_square(self.param.required.grid)
 
             self.param.required.lat = round(self.lat, 2)
             self.param.required.lon = round(self.lon, 2)
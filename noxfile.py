@@ -75,3 +75,35 @@ def jupyter(session):
     session.install("-r", "requirements.txt")
     session.run("jupyter", "trust", "no_ui.ipynb")
     session.run("jupyter", "notebook", "no_ui.ipynb")
+
+
+@nox.session(reuse_venv=True)
+def benchmark(session):
+    """Time each stage of the pipeline over synthetic tiles, results go to benchmark.json.
+
+    Pass the benchmark arguments after "--", e.g. nox -s benchmark -- --size 4500
+    """
+    session.install("-r", "requirements.txt")
+    session.run("python", "-m", "component.scripts.benchmark", *session.posargs)
+
+
+@nox.session(reuse_venv=True)
+def import_time(session):
+    """Check the time needed to import the application tiles, as Voila does at startup.
+
+    Pass the check arguments after "--", e.g. nox -s import_time -- --budget 3
+    """
+    session.install("-r", "requirements.txt")
+    session.run(
+        "python", "-m", "component.scripts.import_time", "--strict", *session.posargs
+    )
+
+
+@nox.session(reuse_venv=True)
+def benchmark_patches(session):
+    """Compare the patch filtering of biota with the block labelling, results go to benchmark_patches.json.
+
+    Pass the benchmark arguments after "--", e.g. nox -s benchmark_patches -- --size 2000
+    """
+    session.install("-r", "requirements.txt")
+    session.run("python", "-m", "component.scripts.benchmark_patches", *session.posargs)